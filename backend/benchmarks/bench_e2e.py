@@ -0,0 +1,287 @@
+"""End-to-end benchmark of the FastAPI app with local fake LLM/embedding backends.
+
+Generates synthetic financial PDFs, ingests them through /api/upload, then
+load tests /api/chat at increasing concurrency, all in-process and offline
+(LLM_BACKEND=fake, EMBEDDING_BACKEND=fake, data in a temporary directory).
+Run from the backend directory:
+
+    python -m benchmarks.bench_e2e --documents 4 --pages 25 --concurrency 1 4 16
+
+Each run is written to --results-dir as JSON and compared with the previous
+run there (or --baseline); metrics that got worse by more than --tolerance
+are reported, and --fail-on-regression turns them into a non-zero exit.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+# metric path -> whether a higher value is better
+TRACKED_METRICS = {
+    ("ingestion", "pages_per_second"): True,
+    ("ingestion", "chunks_per_second"): True,
+    ("memory", "peak_rss_mb"): False,
+}
+CHAT_METRICS = {"requests_per_second": True, "p50_s": False, "p95_s": False, "p99_s": False}
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process (Linux), falling back to the peak"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def configure(work_dir: str, args) -> None:
+    """Point the app at fake backends and a scratch data directory, before config is imported"""
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "EMBEDDING_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        "VECTOR_DB_PATH": os.path.join(work_dir, "vector_store"),
+        "PDF_UPLOAD_PATH": os.path.join(work_dir, "data"),
+        "EMBEDDING_CACHE_PATH": os.path.join(work_dir, "embedding_cache.db") if args.embedding_cache else "",
+        "ANSWER_CACHE_SIZE": "256" if args.answer_cache else "0",
+        "LOG_LEVEL": "WARNING",
+    })
+    os.makedirs(os.path.join(work_dir, "data"))
+    # the sqlite database path is relative to the working directory
+    os.chdir(work_dir)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+
+async def ingest(client, paths):
+    start = time.perf_counter()
+    job_ids = []
+    for path in paths:
+        with open(path, "rb") as f:
+            response = await client.post("/api/upload", files={"file": (os.path.basename(path), f, "application/pdf")})
+        response.raise_for_status()
+        job_ids.append(response.json()["data"]["job_id"])
+
+    jobs = {}
+    while len(jobs) < len(job_ids):
+        for job_id in job_ids:
+            if job_id in jobs:
+                continue
+            job = (await client.get(f"/api/jobs/{job_id}")).json()["data"]
+            if job["status"] in ("ready", "failed"):
+                jobs[job_id] = job
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    failed = [job["filename"] for job in jobs.values() if job["status"] != "ready"]
+    if failed:
+        raise RuntimeError(f"Ingestion failed for {failed}")
+    return elapsed, list(jobs.values())
+
+
+async def run(args) -> dict:
+    from benchmarks.load_chat import percentile, run_level
+    from benchmarks.synthetic_pdf import make_financial_pdf
+    import httpx
+    import main
+
+    paths = [
+        make_financial_pdf(os.path.join(os.getcwd(), f"bench-{index}.pdf"), args.pages, seed=index)
+        for index in range(args.documents)
+    ]
+
+    startup = time.perf_counter()
+    await main.startup_event()
+    # startup time includes model warm-up, whatever WARMUP_MODE is
+    await asyncio.wait([main.warmup_task])
+    startup_seconds = time.perf_counter() - startup
+    memory = {"startup_rss_mb": round(rss_mb(), 1)}
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            elapsed, jobs = await ingest(client, paths)
+            chunks = sum(job["chunks_count"] for job in jobs)
+            stages = {}
+            for job in jobs:
+                for stage, seconds in (job.get("timings") or {}).items():
+                    stages[stage] = round(stages.get(stage, 0.0) + seconds, 4)
+            ingestion = {
+                "documents": len(paths),
+                "pages": args.documents * args.pages,
+                "chunks": chunks,
+                "seconds": round(elapsed, 3),
+                "pages_per_second": round(args.documents * args.pages / elapsed, 2),
+                "chunks_per_second": round(chunks / elapsed, 2),
+                "stage_seconds": stages,
+            }
+            memory["after_ingestion_rss_mb"] = round(rss_mb(), 1)
+
+            chat = []
+            for concurrency in args.concurrency:
+                elapsed, latencies, errors = await run_level(client, concurrency, args.requests, "/api/chat")
+                level = {"concurrency": concurrency, "requests": len(latencies), "errors": errors}
+                if latencies:
+                    level.update({
+                        "requests_per_second": round(len(latencies) / elapsed, 2),
+                        "p50_s": round(percentile(latencies, 0.50), 4),
+                        "p95_s": round(percentile(latencies, 0.95), 4),
+                        "p99_s": round(percentile(latencies, 0.99), 4),
+                    })
+                chat.append(level)
+            memory["after_chat_rss_mb"] = round(rss_mb(), 1)
+    finally:
+        await main.shutdown_event()
+
+    memory["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return {
+        "benchmark": "bench_e2e",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "parameters": {
+            "documents": args.documents,
+            "pages": args.pages,
+            "requests": args.requests,
+            "llm_latency": args.llm_latency,
+            "llm_tokens_per_second": args.llm_tokens_per_second,
+            "embedding_cache": args.embedding_cache,
+            "answer_cache": args.answer_cache,
+        },
+        "startup_seconds": round(startup_seconds, 3),
+        "ingestion": ingestion,
+        "chat": chat,
+        "memory": memory,
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Describe every tracked metric that is worse than the baseline by more than `tolerance`"""
+    pairs = [(f"{section}.{name}", result[section].get(name), baseline.get(section, {}).get(name), higher)
+             for (section, name), higher in TRACKED_METRICS.items()]
+    levels = {level["concurrency"]: level for level in baseline.get("chat", [])}
+    for level in result["chat"]:
+        previous = levels.get(level["concurrency"], {})
+        for name, higher in CHAT_METRICS.items():
+            pairs.append((f"chat[c={level['concurrency']}].{name}", level.get(name), previous.get(name), higher))
+
+    regressions = []
+    for name, value, previous, higher in pairs:
+        if value is None or not previous:
+            continue
+        change = (value - previous) / previous
+        if (-change if higher else change) > tolerance:
+            regressions.append(f"{name}: {previous} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def latest_result(results_dir: str):
+    paths = sorted(glob.glob(os.path.join(results_dir, "bench_e2e-*.json")))
+    return paths[-1] if paths else None
+
+
+def report(result: dict) -> None:
+    ingestion = result["ingestion"]
+    print(
+        f"ingestion: {ingestion['documents']} docs, {ingestion['pages']} pages, {ingestion['chunks']} chunks in "
+        f"{ingestion['seconds']:.2f}s ({ingestion['pages_per_second']:.1f} pages/s, {ingestion['chunks_per_second']:.1f} chunks/s)"
+    )
+    print(f"{'concurrency':>12}{'req/s':>9}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'errors':>8}")
+    for level in result["chat"]:
+        if "p50_s" not in level:
+            print(f"{level['concurrency']:>12}{'-':>9}{'-':>9}{'-':>9}{'-':>9}{level['errors']:>8}")
+            continue
+        print(
+            f"{level['concurrency']:>12}{level['requests_per_second']:>9.2f}{level['p50_s']:>9.3f}"
+            f"{level['p95_s']:>9.3f}{level['p99_s']:>9.3f}{level['errors']:>8}"
+        )
+    memory = result["memory"]
+    print(
+        f"memory: startup {memory['startup_rss_mb']} MB, after ingestion {memory['after_ingestion_rss_mb']} MB, "
+        f"after chat {memory['after_chat_rss_mb']} MB, peak {memory['peak_rss_mb']} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=25, help="pages per document")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=64, help="chat requests per concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM seconds to first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0, help="fake LLM pace, 0 = instant")
+    parser.add_argument("--embedding-cache", action="store_true", help="keep the embedding cache enabled")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache enabled")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--baseline", help="result file to compare with, defaults to the latest in --results-dir")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    results_dir = os.path.abspath(args.results_dir)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else latest_result(results_dir)
+
+    with tempfile.TemporaryDirectory(prefix="bench_e2e-") as work_dir:
+        previous_dir = os.getcwd()
+        configure(work_dir, args)
+        try:
+            result = asyncio.run(run(args))
+        finally:
+            os.chdir(previous_dir)
+
+    report(result)
+
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"bench_e2e-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"results: {path}")
+
+    if baseline_path is None:
+        return
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get("parameters") != result["parameters"]:
+        print(f"baseline {baseline_path} was run with different parameters, not comparing")
+        return
+
+    regressions = compare(result, baseline, args.tolerance)
+    print(f"compared with {os.path.basename(baseline_path)} ({baseline.get('commit') or 'unknown commit'}):")
+    for regression in regressions:
+        print(f"  REGRESSION {regression}")
+    if not regressions:
+        print("  no regressions")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Report embedding throughput (chunks/s) for different batch sizes on CPU.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_embedding --pages 20 --batch-sizes 8 16 32 64 128 --threads 0 4
+
+Chunks come from a synthetic financial PDF split with the configured
+chunk_size/chunk_overlap. --worker also measures the dedicated embedding
+worker process (EMBEDDING_WORKER) at the configured batch size.
+"""
+import argparse
+import os
+import tempfile
+import time
+from services.embeddings import EmbeddingWorker, WorkerEmbeddings, build_local_embeddings
+from services.pdf_processor import PDFProcessor
+from benchmarks.synthetic_pdf import make_financial_pdf
+
+
+def synthetic_chunks(pages: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = make_financial_pdf(os.path.join(tmp, "bench.pdf"), pages)
+        return [document.page_content for document in PDFProcessor(extract_workers=0, page_cache_path="").process_pdf(path, "bench.pdf")]
+
+
+def throughput(embeddings, texts, repeat: int) -> float:
+    # one untimed call so model loading and first-call setup are not measured
+    embeddings.embed_documents(texts[:4])
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        embeddings.embed_documents(texts)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[8, 16, 32, 64, 128])
+    parser.add_argument("--threads", type=int, nargs="*", default=[0], help="torch threads, 0 is the torch default")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--worker", action="store_true")
+    args = parser.parse_args()
+
+    texts = synthetic_chunks(args.pages)
+    print(f"{len(texts)} chunks")
+    print(f"{'mode':<10}{'threads':>8}{'batch':>7}{'chunks/s':>10}")
+
+    for threads in args.threads:
+        for batch_size in args.batch_sizes:
+            embeddings = build_local_embeddings(batch_size=batch_size, threads=threads)
+            rate = throughput(embeddings, texts, args.repeat)
+            print(f"{'local':<10}{threads:>8}{batch_size:>7}{rate:>10.1f}")
+
+    if args.worker:
+        worker = EmbeddingWorker()
+        worker.start()
+        try:
+            rate = throughput(WorkerEmbeddings(worker), texts, args.repeat)
+            print(f"{'worker':<10}{'-':>8}{'-':>7}{rate:>10.1f}")
+        finally:
+            worker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compare serial and process-pool page extraction, per extraction mode.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_extraction --pages 50 300 --workers 2 4 --modes text layout
+
+For every mode the "cached" row reads the same pages back from the page
+cache, which is what re-indexing or re-chunking a known file costs.
+"""
+import argparse
+import os
+import tempfile
+import time
+from services.pdf_processor import PDFProcessor
+from benchmarks.synthetic_pdf import make_financial_pdf
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "..", "data", "sample.pdf")
+
+
+def bench(file_path: str, workers: int, repeat: int, mode: str, page_cache_path: str = ""):
+    processor = PDFProcessor(extract_workers=workers, extraction_mode=mode, page_cache_path=page_cache_path)
+    try:
+        best = float("inf")
+        pages = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            pages = processor.extract_text_from_pdf(file_path, os.path.basename(file_path))
+            best = min(best, time.perf_counter() - start)
+        return best, pages
+    finally:
+        processor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="*", default=[50, 300], help="synthetic PDF sizes")
+    parser.add_argument("--workers", type=int, nargs="*", default=[2, 4], help="process pool sizes")
+    parser.add_argument("--modes", nargs="*", default=["text", "layout"], help="PDF_EXTRACTION_MODE values")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = [SAMPLE_PDF] if os.path.exists(SAMPLE_PDF) else []
+        files += [make_financial_pdf(os.path.join(tmp, f"synthetic_{n}.pdf"), n) for n in args.pages]
+
+        print(f"{'file':<24}{'mode':>8}{'pages':>7}{'tables':>8}{'workers':>9}{'seconds':>10}{'pages/s':>10}{'speedup':>9}")
+        for file_path in files:
+            name = os.path.basename(file_path)
+            for mode in args.modes:
+                serial_time, serial_pages = bench(file_path, 0, args.repeat, mode)
+                count = len(serial_pages)
+                tables = sum(len(page.get("tables") or []) for page in serial_pages)
+                row = f"{name:<24}{mode:>8}{count:>7}{tables:>8}"
+                print(f"{row}{'serial':>9}{serial_time:>10.2f}{count / serial_time:>10.1f}{1:>9.2f}")
+
+                for workers in args.workers:
+                    elapsed, pages = bench(file_path, workers, args.repeat, mode)
+                    if pages != serial_pages:
+                        raise SystemExit(f"{name}: parallel output with {workers} workers differs from serial")
+                    print(f"{row}{workers:>9}{elapsed:>10.2f}{count / elapsed:>10.1f}{serial_time / elapsed:>9.2f}")
+
+                cache_path = os.path.join(tmp, f"page_cache-{mode}.db")
+                bench(file_path, 0, 1, mode, cache_path)
+                elapsed, pages = bench(file_path, 0, args.repeat, mode, cache_path)
+                if pages != serial_pages:
+                    raise SystemExit(f"{name}: cached {mode} pages differ from extracted ones")
+                print(f"{row}{'cached':>9}{elapsed:>10.2f}{count / elapsed:>10.1f}{serial_time / elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
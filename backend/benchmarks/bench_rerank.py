@@ -0,0 +1,105 @@
+"""Measure what the cross-encoder rerank stage costs and what it buys.
+
+Ingests one synthetic financial statement into a scratch vector store, then
+asks page-specific questions ("What was Goodwill in 2023 on page 17?") and
+compares retrieval without reranking against reranking at several time
+budgets: retrieval latency, recall@k and MRR of the asked page, and the
+context tokens sent to the LLM. Run from the backend directory:
+
+    python -m benchmarks.bench_rerank --pages 60 --questions 100 --budgets 0.05 0.2 0
+
+Fake embeddings and a token-overlap cross-encoder are used unless
+--real-models is given, in which case the configured models are loaded.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def configure(work_dir: str, real_models: bool) -> None:
+    """Scratch stores and offline backends, before config is imported"""
+    os.environ.update({
+        "VECTOR_DB_PATH": os.path.join(work_dir, "vector_store"),
+        "EMBEDDING_CACHE_PATH": "",
+        "ANSWER_CACHE_SIZE": "0",
+        "LLM_BACKEND": "fake",
+        "HYBRID_SEARCH": "True",
+        "LOG_LEVEL": "WARNING",
+    })
+    if not real_models:
+        os.environ.update({"EMBEDDING_BACKEND": "fake", "RERANKER_BACKEND": "fake"})
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--budgets", type=float, nargs="*", default=[0.05, 0.2, 0.0], help="rerank time budgets in seconds, 0 = unbounded")
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=0, help="documents kept after reranking, 0 = RETRIEVAL_K")
+    parser.add_argument("--real-models", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_rerank-") as work_dir:
+        configure(work_dir, args.real_models)
+        from benchmarks.load_chat import percentile
+        from benchmarks.synthetic_pdf import LINE_ITEMS, make_financial_pdf
+        from services.pdf_processor import PDFProcessor
+        from services.rag_pipeline import RAGPipeline
+        from services.reranker import CrossEncoderReranker
+        from services.vector_store import VectorStoreService
+        from config import settings
+
+        settings.rerank_candidates = args.candidates
+        settings.rerank_top_k = args.top_k
+        path = make_financial_pdf(os.path.join(work_dir, "report.pdf"), args.pages, seed=3)
+        vector_store = VectorStoreService()
+        vector_store.add_documents(PDFProcessor(extract_workers=0, page_cache_path="").process_pdf(path, "report.pdf"))
+        pipeline = RAGPipeline(vector_store)
+
+        rng = random.Random(0)
+        questions = [
+            (f"What was {rng.choice(LINE_ITEMS)} in 2023 on page {page}?", page)
+            for page in (rng.randint(1, args.pages) for _ in range(args.questions))
+        ]
+
+        variants = [("no rerank", None)] + [
+            (f"rerank {budget:g}s" if budget else "rerank unbounded", CrossEncoderReranker(time_budget=budget))
+            for budget in args.budgets
+        ]
+        print(f"{'variant':<18}{'p50 ms':>9}{'p95 ms':>9}{'recall':>8}{'MRR':>7}{'ctx tokens':>12}")
+        for name, reranker in variants:
+            pipeline.reranker = reranker
+            if reranker is not None:
+                # model loading is a one-off, keep it out of the numbers
+                reranker.rerank("warm up", [(document, 0.0) for document, _ in vector_store.lexical_search("revenue", 1)], 1)
+
+            latencies, hits, reciprocal_ranks, tokens = [], 0, 0.0, 0
+            for question, page in questions:
+                start = time.perf_counter()
+                documents = pipeline._retrieve_documents(question)
+                latencies.append(time.perf_counter() - start)
+
+                pages = [document.page for document in documents]
+                if page in pages:
+                    hits += 1
+                    reciprocal_ranks += 1 / (pages.index(page) + 1)
+                tokens += pipeline.context_builder.build(documents)[1]["context_tokens"]
+
+            print(
+                f"{name:<18}{1000 * percentile(latencies, 0.5):>9.1f}{1000 * percentile(latencies, 0.95):>9.1f}"
+                f"{hits / len(questions):>8.2f}{reciprocal_ranks / len(questions):>7.2f}{tokens / len(questions):>12.0f}"
+            )
+        pipeline.close()
+        vector_store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Compare prompt size per turn: client-sent chat_history vs server-side sessions.
+
+Ingests one synthetic financial statement into a scratch vector store, then
+holds one long conversation twice: once resending the whole history every
+turn, as ChatRequest.chat_history does, and once through a ChatSessionStore,
+which keeps recent turns and folds older ones into a summary. Prints the
+prompt tokens of every --every-th turn and the summarization cost. Run from
+the backend directory:
+
+    python -m benchmarks.bench_sessions --turns 40 --window 4
+
+Fake embeddings and a fake LLM are used unless --real-models is given, in
+which case the configured models are loaded.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def configure(work_dir: str, real_models: bool) -> None:
+    """Scratch stores and offline backends, before config is imported"""
+    os.environ.update({
+        "VECTOR_DB_PATH": os.path.join(work_dir, "vector_store"),
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(work_dir, 'sessions.db')}",
+        "EMBEDDING_CACHE_PATH": "",
+        "ANSWER_CACHE_SIZE": "0",
+        "LOG_LEVEL": "WARNING",
+    })
+    if not real_models:
+        os.environ.update({"EMBEDDING_BACKEND": "fake", "LLM_BACKEND": "fake", "FAKE_LLM_LATENCY": "0"})
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+
+async def converse(pipeline, questions, store=None):
+    """Prompt tokens of every turn, with the history sent by the client or kept by `store`"""
+    from services.metrics import TOKENS
+
+    history, sizes = [], []
+    session = await store.create() if store is not None else None
+    for question in questions:
+        before = TOKENS.values[("prompt",)]
+        if session is None:
+            result = await pipeline.agenerate_answer(question, chat_history=history)
+            history.append({"user": question, "assistant": result["answer"]})
+        else:
+            result = await pipeline.agenerate_answer(question, chat_history=list(session.turns), history_summary=session.summary)
+            await store.add_turn(session, question, result["answer"], pipeline.asummarize)
+            # the summary of a real deployment is usually done before the user types the next question
+            if session.session_id in store.tasks:
+                await store.tasks[session.session_id]
+            session = await store.get(session.session_id)
+        sizes.append(TOKENS.values[("prompt",)] - before)
+    return sizes
+
+
+async def run(args, work_dir: str) -> None:
+    from benchmarks.synthetic_pdf import LINE_ITEMS, make_financial_pdf
+    from services.chat_sessions import ChatSessionStore
+    from services.metrics import TOKENS
+    from services.pdf_processor import PDFProcessor
+    from services.rag_pipeline import RAGPipeline
+    from services.vector_store import VectorStoreService
+    from sqlite.database import engine, migrate
+
+    await migrate()
+    path = make_financial_pdf(os.path.join(work_dir, "report.pdf"), args.pages, seed=3)
+    vector_store = VectorStoreService()
+    vector_store.add_documents(PDFProcessor(extract_workers=0, page_cache_path="").process_pdf(path, "report.pdf"))
+    pipeline = RAGPipeline(vector_store)
+
+    rng = random.Random(0)
+    questions = [f"And what was {rng.choice(LINE_ITEMS)} in {rng.choice((2022, 2023))}?" for _ in range(args.turns)]
+    client = await converse(pipeline, questions)
+    summary_before = TOKENS.values[("summary_prompt",)] + TOKENS.values[("summary_completion",)]
+    session = await converse(pipeline, questions, ChatSessionStore(window=args.window))
+    summary_tokens = TOKENS.values[("summary_prompt",)] + TOKENS.values[("summary_completion",)] - summary_before
+
+    print(f"{'turn':>6}{'chat_history':>14}{'session':>10}")
+    for turn in range(0, args.turns, args.every):
+        print(f"{turn + 1:>6}{client[turn]:>14.0f}{session[turn]:>10.0f}")
+    print(f"{'total':>6}{sum(client):>14.0f}{sum(session):>10.0f}")
+    print(f"summarization tokens (prompt + completion): {summary_tokens:.0f}")
+    pipeline.close()
+    vector_store.close()
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--window", type=int, default=4, help="CHAT_SESSION_WINDOW")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--every", type=int, default=5, help="print every n-th turn")
+    parser.add_argument("--real-models", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_sessions-") as work_dir:
+        configure(work_dir, args.real_models)
+        asyncio.run(run(args, work_dir))
+
+
+if __name__ == "__main__":
+    main()
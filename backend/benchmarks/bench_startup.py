@@ -0,0 +1,114 @@
+"""Measure how long a worker takes to boot and to become ready.
+
+Each run starts a fresh Python process that imports the app, runs the startup
+event, polls /ready and then sends two /api/chat requests, so the cost that
+warm-up moves off the first request shows up as first vs second chat latency.
+Every WARMUP_MODE given is measured, medians over --runs are reported. Run
+from the backend directory:
+
+    python -m benchmarks.bench_startup --runs 5 --modes background blocking off
+
+Fake LLM/embedding backends and a scratch data directory are used unless
+--real-models is given, in which case the configured models are loaded.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STEPS = ("import", "startup", "ready", "first_chat", "second_chat", "process")
+
+
+async def measure(main, started: float) -> dict:
+    import httpx
+
+    result = {"import": time.perf_counter() - started}
+    start = time.perf_counter()
+    await main.startup_event()
+    result["startup"] = time.perf_counter() - start
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            while (await client.get("/ready")).status_code != 200:
+                if main.warmup_task.done():
+                    raise RuntimeError("Warm-up failed")
+                await asyncio.sleep(0.005)
+            result["ready"] = time.perf_counter() - start
+
+            for step in ("first_chat", "second_chat"):
+                request_start = time.perf_counter()
+                response = await client.post("/api/chat", json={"question": "What was total revenue in 2023?"})
+                response.raise_for_status()
+                result[step] = time.perf_counter() - request_start
+    finally:
+        await main.shutdown_event()
+    return result
+
+
+def child() -> None:
+    """One measured boot, prints its timings as JSON"""
+    started = time.perf_counter()
+    sys.path.insert(0, BACKEND_DIR)
+    import main
+
+    print(json.dumps(asyncio.run(measure(main, started))))
+
+
+def run_once(mode: str, real_models: bool) -> dict:
+    with tempfile.TemporaryDirectory(prefix="bench_startup-") as work_dir:
+        env = dict(
+            os.environ,
+            WARMUP_MODE=mode,
+            LLM_BACKEND="fake",
+            FAKE_LLM_LATENCY="0",
+            VECTOR_DB_PATH=os.path.join(work_dir, "vector_store"),
+            PDF_UPLOAD_PATH=work_dir,
+            EMBEDDING_CACHE_PATH="",
+            ANSWER_CACHE_SIZE="0",
+            LOG_LEVEL="WARNING",
+        )
+        if not real_models:
+            env.update(EMBEDDING_BACKEND="fake", RERANKER_BACKEND="fake")
+
+        start = time.perf_counter()
+        # the sqlite database path is relative to the working directory
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child"],
+            cwd=work_dir, env=env, capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{completed.stderr}")
+
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process"] = elapsed
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", nargs="*", default=["background", "blocking", "off"], help="WARMUP_MODE values to compare")
+    parser.add_argument("--real-models", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    print(f"median seconds over {args.runs} runs")
+    print(f"{'mode':<12}" + "".join(f"{step:>13}" for step in STEPS))
+    for mode in args.modes:
+        runs = [run_once(mode, args.real_models) for _ in range(args.runs)]
+        print(f"{mode:<12}" + "".join(f"{statistics.median(run[step] for run in runs):>13.3f}" for step in STEPS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Compare the Chroma and memory-mapped NumPy vector backends on the same corpus.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_vector_backends --vectors 20000 100000 --dimensions 384
+
+Vectors are drawn around random cluster centres (like sentence embeddings,
+unlike uniform noise) and normalised. For each backend this reports insert
+throughput, cold open (a fresh process opening the store and answering one
+query), query latency and recall@k against an exact scan.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from benchmarks.load_chat import percentile
+
+BACKENDS = [("chromadb", "flat"), ("mmap", "flat"), ("mmap", "ivf")]
+
+
+def synthetic_vectors(count: int, dimensions: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(max(1, count // 200), dimensions))
+    vectors = centres[rng.integers(len(centres), size=count)] + 0.5 * rng.normal(size=(count, dimensions))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def open_backend(vector_db_type: str, index: str, path: str):
+    from config import settings
+    from services.vector_backends import build_vector_backend
+
+    settings.mmap_index = index
+    return build_vector_backend(vector_db_type, path)
+
+
+def cold_open(vector_db_type: str, index: str, path: str, dimensions: int) -> float:
+    """Seconds for a new process to open the store and answer its first query"""
+    code = (
+        "import time; start = time.perf_counter()\n"
+        "from benchmarks.bench_vector_backends import open_backend\n"
+        f"backend = open_backend({vector_db_type!r}, {index!r}, {path!r})\n"
+        f"backend.get_collection('bench').query([0.0] * {dimensions - 1} + [1.0], 5)\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], cwd=backend_dir, capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def bench(vector_db_type: str, index: str, vectors: np.ndarray, queries: np.ndarray, k: int, batch: int) -> dict:
+    with tempfile.TemporaryDirectory() as path:
+        backend = open_backend(vector_db_type, index, path)
+        collection = backend.get_collection("bench")
+
+        start = time.perf_counter()
+        for offset in range(0, len(vectors), batch):
+            rows = vectors[offset:offset + batch]
+            collection.upsert(
+                [f"chunk-{offset + i}" for i in range(len(rows))],
+                rows.tolist(),
+                [f"chunk {offset + i}" for i in range(len(rows))],
+                [{"filename": "bench.pdf", "page": (offset + i) // 4 + 1} for i in range(len(rows))],
+            )
+        insert_seconds = time.perf_counter() - start
+
+        # first query pays for IVF training, keep it out of the latency numbers
+        collection.query(queries[0].tolist(), k)
+        latencies, recall = [], 0
+        for query in queries:
+            exact = {f"chunk-{i}" for i in np.argsort(((vectors - query) ** 2).sum(axis=1))[:k]}
+            start = time.perf_counter()
+            found = collection.query(query.tolist(), k)
+            latencies.append(time.perf_counter() - start)
+            recall += len(exact & {document.id for document, _ in found})
+        backend.close()
+
+        return {
+            "insert_per_second": len(vectors) / insert_seconds,
+            "cold_open_seconds": cold_open(vector_db_type, index, path, vectors.shape[1]),
+            "p50_ms": 1000 * percentile(latencies, 0.50),
+            "p95_ms": 1000 * percentile(latencies, 0.95),
+            "recall": recall / (k * len(queries)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, nargs="*", default=[20000])
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=1000, help="vectors per upsert")
+    args = parser.parse_args()
+
+    print(f"{'vectors':>9}  {'backend':<14}{'insert/s':>10}{'cold open s':>13}{'p50 ms':>9}{'p95 ms':>9}{'recall':>8}")
+    for count in args.vectors:
+        vectors = synthetic_vectors(count, args.dimensions)
+        # queries near stored chunks, as real questions are near their answers
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.choice(count, size=args.queries)] + 0.05 * rng.normal(size=(args.queries, args.dimensions))
+        queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+        for vector_db_type, index in BACKENDS:
+            result = bench(vector_db_type, index, vectors, queries, args.k, args.batch)
+            print(
+                f"{count:>9}  {vector_db_type + '/' + index:<14}{result['insert_per_second']:>10.0f}"
+                f"{result['cold_open_seconds']:>13.3f}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['recall']:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Load test /api/chat at increasing concurrency against a running server.
+
+Start the API (uvicorn main:app) with some documents ingested, then run
+from the backend directory:
+
+    python -m benchmarks.load_chat --url http://127.0.0.1:8000 --concurrency 1 4 16
+
+With the async pipeline, requests/s should grow with concurrency until the
+LLM_CONCURRENCY / RETRIEVAL_WORKERS limits or the LLM endpoint saturate.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+QUESTIONS = [
+    "What was the total revenue?",
+    "What was the net income?",
+    "How much cash and cash equivalents does the company hold?",
+    "What are the total liabilities?",
+    "How did operating income change compared to the prior year?",
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, requests: int, path: str):
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def user():
+        nonlocal errors
+        for i in counter:
+            # a numeric suffix keeps the semantic answer cache from short-circuiting the load
+            question = f"{QUESTIONS[i % len(QUESTIONS)]} ({i})"
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json={"question": question})
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies, errors
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/api/chat")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        print(f"{'concurrency':>12}{'req/s':>9}{'p50 s':>9}{'p95 s':>9}{'errors':>8}")
+        for concurrency in args.concurrency:
+            elapsed, latencies, errors = await run_level(client, concurrency, args.requests, args.path)
+            if not latencies:
+                print(f"{concurrency:>12}{'-':>9}{'-':>9}{'-':>9}{errors:>8}")
+                continue
+            print(
+                f"{concurrency:>12}{len(latencies) / elapsed:>9.2f}"
+                f"{statistics.median(latencies):>9.2f}{percentile(latencies, 0.95):>9.2f}{errors:>8}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
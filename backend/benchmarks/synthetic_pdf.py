@@ -0,0 +1,39 @@
+import random
+import fitz
+
+LINE_ITEMS = [
+    "Revenue", "Cost of revenue", "Gross profit", "Research and development",
+    "Selling, general and administrative", "Operating income", "Interest expense",
+    "Income before income taxes", "Provision for income taxes", "Net income",
+    "Cash and cash equivalents", "Accounts receivable", "Inventories",
+    "Total current assets", "Property and equipment, net", "Goodwill",
+    "Total assets", "Accounts payable", "Long-term debt", "Total liabilities",
+    "Retained earnings", "Total stockholders' equity",
+]
+
+
+def make_financial_pdf(path: str, pages: int, seed: int = 0) -> str:
+    """Write a synthetic financial statement with `pages` pages to `path`"""
+    rng = random.Random(seed)
+    document = fitz.open()
+
+    for number in range(1, pages + 1):
+        page = document.new_page()
+        lines = [
+            f"Example Holdings Inc. - Consolidated Statements (page {number})",
+            "(in millions of USD)                2023          2022",
+        ]
+        for item in rng.sample(LINE_ITEMS, k=len(LINE_ITEMS)):
+            current = rng.randint(100, 99999)
+            previous = rng.randint(100, 99999)
+            lines.append(f"{item:<40}{current:>10,}    {previous:>10,}")
+        lines.append("")
+        lines.append(
+            "Management believes the results reflect continued growth in the core "
+            "business, partially offset by higher operating expenses and currency effects."
+        )
+        page.insert_text((36, 48), "\n".join(lines), fontsize=9)
+
+    document.save(path)
+    document.close()
+    return path
@@ -2,6 +2,7 @@ import os
 from typing import List
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
+import static
 
 load_dotenv()
 class Settings(BaseSettings):
@@ -13,30 +14,136 @@ class Settings(BaseSettings):
     
     # Vector database configuration
     vector_db_path: str = os.getenv("VECTOR_DB_PATH", "./vector_store")
+    # "chromadb", or "mmap" for a NumPy index on memory-mapped files with metadata in SQLite
     vector_db_type: str = os.getenv("VECTOR_DB_TYPE", "chromadb")
+    # mmap backend: "flat" (exact) or "ivf"; ivf_lists 0 = sqrt(vectors), ivf_probe lists scanned per query
+    mmap_index: str = os.getenv("MMAP_INDEX", "flat")
+    ivf_lists: int = int(os.getenv("IVF_LISTS", "0"))
+    ivf_probe: int = int(os.getenv("IVF_PROBE", "16"))
+    # "single" collection, or "document" for one collection per uploaded file
+    vector_partition_mode: str = os.getenv("VECTOR_PARTITION_MODE", "single")
+    
+    # Document database (async SQLAlchemy, WAL mode)
+    database_url: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./mydatabase.db")
+    database_echo: bool = os.getenv("DATABASE_ECHO", "False").lower() == "true"
+    database_pool_size: int = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+    database_max_overflow: int = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+    # milliseconds a connection waits for the write lock before failing
+    database_busy_timeout: int = int(os.getenv("DATABASE_BUSY_TIMEOUT", "5000"))
     
     # PDF upload path
     pdf_upload_path: str = os.getenv("PDF_UPLOAD_PATH", "../data") #ok
+    # largest accepted upload in bytes, uploads are streamed so this does not bound memory
+    max_upload_size: int = int(os.getenv("MAX_UPLOAD_SIZE", str(static.MAX_SIZE)))
     
     # Embedding model configuration
+    # "huggingface", or "fake" for deterministic hashed embeddings (benchmarks, offline runs)
+    embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "huggingface")
+    fake_embedding_dimensions: int = int(os.getenv("FAKE_EMBEDDING_DIMENSIONS", "384"))
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    embedding_device: str = os.getenv("EMBEDDING_DEVICE", "cpu")
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    # torch intra-op threads for the embedding model, 0 keeps the torch default
+    embedding_threads: int = int(os.getenv("EMBEDDING_THREADS", "0"))
+    # serve all embeddings from one dedicated process that keeps the model warm
+    embedding_worker: bool = os.getenv("EMBEDDING_WORKER", "False").lower() == "true"
+    # a socket path and key let every uvicorn worker share the writer's embedding worker
+    embedding_worker_address: str = os.getenv("EMBEDDING_WORKER_ADDRESS", "")
+    embedding_worker_authkey: str = os.getenv("EMBEDDING_WORKER_AUTHKEY", "")
+    # chunk text hash -> embedding cache, empty disables it
+    embedding_cache_path: str = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db")
     
     # LLM configuration
     llm_model: str = os.getenv("LLM_MODEL", "mistralai/Mixtral-8x7B-Instruct-v0.1")
     llm_temperature: float = float(os.getenv("LLM_TEMPERATURE", "0.1"))
     max_tokens: int = int(os.getenv("MAX_TOKENS", "1000"))
+    # "huggingface", or "fake" for a local stand-in answering from the context
+    llm_backend: str = os.getenv("LLM_BACKEND", "huggingface")
+    # fake LLM: seconds to first token, streaming pace (0 = instant) and answer length
+    fake_llm_latency: float = float(os.getenv("FAKE_LLM_LATENCY", "0.2"))
+    fake_llm_tokens_per_second: float = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "0"))
+    fake_llm_answer_tokens: int = int(os.getenv("FAKE_LLM_ANSWER_TOKENS", "64"))
     
     # Chunking configuration
     chunk_size: int = int(os.getenv("CHUNK_SIZE", "1000")) #ok
     chunk_overlap: int = int(os.getenv("CHUNK_OVERLAP", "200")) #ok
     
+    # Ingestion configuration
+    ingestion_workers: int = int(os.getenv("INGESTION_WORKERS", "2"))
+    # 0 extracts pages serially, otherwise the size of the extraction process pool
+    pdf_extract_workers: int = int(os.getenv("PDF_EXTRACT_WORKERS", "0"))
+    pdf_extract_pages_per_task: int = int(os.getenv("PDF_EXTRACT_PAGES_PER_TASK", "8"))
+    # "text" keeps page.extract_text(); "layout" finds tables with pdfplumber's table finder
+    # and chunks them row by row with the header row on every chunk
+    pdf_extraction_mode: str = os.getenv("PDF_EXTRACTION_MODE", "text")
+    # extracted pages keyed by (file hash, page, extractor version), empty disables it
+    page_cache_path: str = os.getenv("PAGE_CACHE_PATH", "./page_cache.db")
+    # chunks handed to the vector store per add_documents call while streaming a file
+    ingest_batch_size: int = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+    
     # Retrieval configuration
     retrieval_k: int = int(os.getenv("RETRIEVAL_K", "5"))
     similarity_threshold: float = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+    # context assembly: token budget for retrieved text (0 = unlimited), and the
+    # shingle similarity above which a passage counts as a near-duplicate
+    context_token_budget: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+    context_duplicate_threshold: float = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+    # fuse BM25 and vector rankings with reciprocal rank fusion; sources keep the vector
+    # distance as score and carry the fused score as fused_score. Chunks only BM25 found
+    # are kept within hybrid_lexical_threshold of the query (defaults to similarity_threshold,
+    # raise it to let exact-token matches with a weak vector match through)
+    hybrid_search: bool = os.getenv("HYBRID_SEARCH", "False").lower() == "true"
+    hybrid_candidates: int = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    hybrid_lexical_threshold: float = float(os.getenv("HYBRID_LEXICAL_THRESHOLD", os.getenv("SIMILARITY_THRESHOLD", "0.7")))
+    rrf_k: int = int(os.getenv("RRF_K", "60"))
+    # cross-encoder reranking of the fused candidates: rerank_candidates are
+    # scored in batches and the best retrieval_k kept, within rerank_time_budget seconds
+    rerank: bool = os.getenv("RERANK", "False").lower() == "true"
+    # "huggingface", or "fake" for a token-overlap scorer (benchmarks, offline runs)
+    reranker_backend: str = os.getenv("RERANKER_BACKEND", "huggingface")
+    reranker_model: str = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    rerank_candidates: int = int(os.getenv("RERANK_CANDIDATES", "20"))
+    # documents kept after reranking, 0 = retrieval_k; a better ranking can afford a smaller context
+    rerank_top_k: int = int(os.getenv("RERANK_TOP_K", "0"))
+    rerank_batch_size: int = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    rerank_time_budget: float = float(os.getenv("RERANK_TIME_BUDGET", "0.5"))
+    fake_reranker_latency: float = float(os.getenv("FAKE_RERANKER_LATENCY", "0.002"))
+    # threads for query embedding and vector search, and concurrent LLM calls per worker
+    retrieval_workers: int = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+    llm_concurrency: int = int(os.getenv("LLM_CONCURRENCY", "8"))
+    # /api/chat/batch: most questions per request, and LLM calls one batch may have in flight
+    chat_batch_max_questions: int = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "200"))
+    chat_batch_concurrency: int = int(os.getenv("CHAT_BATCH_CONCURRENCY", "4"))
+    # server-side chat sessions: turns kept verbatim before older ones are folded into a
+    # summary of at most chat_summary_max_tokens; sessions idle for chat_session_ttl seconds
+    # expire, the least recently used are evicted beyond the count or the bytes of text held;
+    # sessions are kept in the database, every worker serves them
+    chat_session_window: int = int(os.getenv("CHAT_SESSION_WINDOW", "4"))
+    chat_summary_max_tokens: int = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "256"))
+    chat_session_ttl: float = float(os.getenv("CHAT_SESSION_TTL", "3600"))
+    chat_session_max_count: int = int(os.getenv("CHAT_SESSION_MAX_COUNT", "1000"))
+    chat_session_max_bytes: int = int(os.getenv("CHAT_SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+    
+    # Answer cache configuration, size 0 disables it
+    answer_cache_size: int = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+    answer_cache_ttl: float = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+    answer_cache_max_distance: float = float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0.05"))
+    
+    # Startup: "background" warms the models up after the server starts, and /ready
+    # answers 503 until done; "blocking" finishes warm-up before accepting requests;
+    # "off" loads the models on first use
+    warmup_mode: str = os.getenv("WARMUP_MODE", "background")
     
     # Server configuration
     host: str = os.getenv("HOST", "0.0.0.0")
     port: int = int(os.getenv("PORT", "8000"))
+    # uvicorn worker processes; one of them (holding writer_lock_path) ingests and writes the
+    # vector store, the others reload it when store_generation_path changes, both checked every
+    # worker_sync_interval seconds
+    workers: int = int(os.getenv("WORKERS", "1"))
+    writer_lock_path: str = os.getenv("WRITER_LOCK_PATH", "./writer.lock")
+    store_generation_path: str = os.getenv("STORE_GENERATION_PATH", "./store.generation")
+    worker_sync_interval: float = float(os.getenv("WORKER_SYNC_INTERVAL", "1.0"))
     debug: bool = os.getenv("DEBUG", "True").lower() == "true"
     
     # CORS configuration
@@ -1,15 +1,26 @@
-from fastapi import FastAPI, Request, UploadFile, File, Depends
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Request, UploadFile, File, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.middleware.cors import CORSMiddleware
-from models.schemas import ChatRequest, ChatResponse, DocumentsResponse, UploadResponse, ChunksResponse, DocumentInfo
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from models.schemas import BatchChatRequest, ChatRequest, ChatResponse, ChatSessionInfo, DocumentsResponse, UploadResponse, ChunksResponse, DocumentInfo, JobInfo
 from services.pdf_processor import PDFProcessor
 from services.vector_store import VectorStoreService
 from services.rag_pipeline import RAGPipeline
-from services.api import ApiResponse, ApiException
+from services.ingestion import IngestionQueue
+from services.chat_sessions import ChatSession, ChatSessionStore
+from services.workers import Changes, WorkerCoordinator
+from services.api import ApiResponse, ApiException, SseEvent
+from services.uploads import stage_upload, stored_path
+from services.metrics import ERRORS, collect_timings, metrics
 from config import settings
-from sqlite.database import db, engine, Base
+from sqlite.database import db, engine, migrate
 from sqlite.models import pdf
 from datetime import datetime
+from typing import List, Optional
+import asyncio
+import contextlib
+import os
+import json
 import logging
 import time
 import static
@@ -38,6 +49,82 @@ app.add_middleware(
 pdf_processor: PDFProcessor
 vector_store: VectorStoreService
 rag_pipeline: RAGPipeline
+ingestion_queue: IngestionQueue
+chat_sessions: ChatSessionStore
+# writer election and store change notification between uvicorn workers
+coordinator: WorkerCoordinator
+# model warm-up, /ready answers 503 until it is done
+warmup_task: Optional[asyncio.Task] = None
+startup_seconds: float = 0.0
+
+
+def _answer_cache_stat(key: str) -> float:
+    # gauges may be scraped before startup has created the pipeline
+    pipeline = globals().get("rag_pipeline")
+    return pipeline.answer_cache.stats()[key] if pipeline is not None else 0.0
+
+
+def _chat_session_stat(key: str) -> float:
+    store = globals().get("chat_sessions")
+    return store.stats()[key] if store is not None else 0.0
+
+
+metrics.gauge("rag_answer_cache_hit_rate", "Answer cache hits / lookups", lambda: _answer_cache_stat("hit_rate"))
+metrics.gauge("rag_answer_cache_hits", "Answer cache hits", lambda: _answer_cache_stat("hits"))
+metrics.gauge("rag_answer_cache_misses", "Answer cache misses", lambda: _answer_cache_stat("misses"))
+metrics.gauge("rag_answer_cache_entries", "Answers currently cached", lambda: _answer_cache_stat("entries"))
+metrics.gauge(
+    "rag_answer_cache_avg_hit_latency_seconds",
+    "Average latency of answer cache hits",
+    lambda: _answer_cache_stat("avg_hit_latency_ms") / 1000,
+)
+metrics.gauge("rag_chat_sessions", "Server-side chat sessions held, as of the last turn in this worker", lambda: _chat_session_stat("sessions"))
+metrics.gauge("rag_chat_session_bytes", "Conversation text held by chat sessions, as of the last turn in this worker", lambda: _chat_session_stat("bytes"))
+metrics.gauge("rag_chat_session_evictions", "Chat sessions evicted to stay within the count and memory limits", lambda: _chat_session_stat("evictions"))
+metrics.gauge("rag_writer", "1 in the worker that ingests and writes the vector store", lambda: float(_is_writer()))
+metrics.gauge("rag_ready", "1 once startup and model warm-up have finished", lambda: float(_is_ready()))
+metrics.gauge("rag_startup_seconds", "Seconds from startup to ready", lambda: startup_seconds)
+
+
+def _is_writer() -> bool:
+    return globals().get("coordinator") is not None and coordinator.is_writer
+
+
+def _is_ready() -> bool:
+    return warmup_task is not None and warmup_task.done() and not warmup_task.cancelled() and warmup_task.exception() is None
+
+
+async def warm_up(started: float) -> dict:
+    """Load the models and run a dummy embedding and search, so the first request does not pay for it"""
+    global startup_seconds
+
+    timings = {}
+    if settings.warmup_mode != "off":
+        try:
+            timings = await asyncio.to_thread(rag_pipeline.warm_up)
+        except Exception as e:
+            logger.error(f"Warm-up failed: {e}")
+            ERRORS.inc(source="warmup")
+            raise
+
+    startup_seconds = time.perf_counter() - started
+    logger.info(f"Ready in {startup_seconds:.2f}s (warm-up {sum(timings.values()):.2f}s)")
+    return timings
+
+
+async def promote() -> None:
+    """Take over ingestion and vector store writes, once this worker holds the writer lock"""
+    if vector_store.read_only:
+        # a reader taking over from a writer that exited
+        await asyncio.to_thread(vector_store.promote)
+    vector_store.add_change_listener(coordinator.record)
+    await ingestion_queue.start()
+
+
+async def refresh(changes: Changes) -> None:
+    """The writer changed the vector store, reload this reader's view of it"""
+    added, removed = changes if changes is not None else (None, None)
+    await asyncio.to_thread(vector_store.refresh, added, removed)
 
 @app.on_event("startup")
 async def startup_event():
@@ -46,20 +133,67 @@ async def startup_event():
     global pdf_processor
     global vector_store
     global rag_pipeline
+    global ingestion_queue
+    global chat_sessions
+    global coordinator
+    global warmup_task
 
     logger.info("Starting RAG Q&A System...")
-
-    #initial pdf_processor
-    pdf_processor = PDFProcessor()
-    
-    #initial vevtor_store
-    vector_store = VectorStoreService()
-    
-    #initial rag_pipeline
-    rag_pipeline = RAGPipeline(vector_store=vector_store)
-    
-    #initial sqlite
-    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+
+    #initial worker role, workers start one after the other
+    coordinator = WorkerCoordinator()
+    with coordinator.startup():
+        writer = coordinator.try_acquire()
+
+        #initial sqlite
+        await migrate()
+
+        #initial pdf_processor
+        pdf_processor = PDFProcessor()
+
+        #initial vevtor_store
+        vector_store = VectorStoreService(read_only=not writer)
+
+        #initial rag_pipeline
+        rag_pipeline = RAGPipeline(vector_store=vector_store)
+
+        #initial chat sessions
+        chat_sessions = ChatSessionStore()
+
+        #initial ingestion workers, only the writer runs them
+        ingestion_queue = IngestionQueue(pdf_processor=pdf_processor, vector_store=vector_store)
+        if writer:
+            await promote()
+    coordinator.start(promote=promote, sync=ingestion_queue.sync, refresh=refresh)
+
+    #initial models, see WARMUP_MODE
+    warmup_task = asyncio.create_task(warm_up(started))
+    if settings.warmup_mode != "background":
+        await asyncio.wait([warmup_task])
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers on shutdown"""
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+        await asyncio.wait([warmup_task])
+    await coordinator.stop()
+    await ingestion_queue.stop()
+    await chat_sessions.close()
+    pdf_processor.close()
+    rag_pipeline.close()
+    vector_store.close()
+    await engine.dispose()
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Refuse oversized uploads from Content-Length, before the multipart body is read"""
+    if request.url.path == "/api/upload" or request.url.path.endswith("/reindex"):
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > settings.max_upload_size + static.MULTIPART_OVERHEAD:
+            return ApiResponse(code=413, message=f"Maximum limit ({settings.max_upload_size // (1024 * 1024)}MB).")
+    return await call_next(request)
 
 #handle all raise error
 @app.exception_handler(Exception)
@@ -75,6 +209,9 @@ async def global_exception_handler(request: Request, exc: Exception):
         message = exc.message
         data = exc.data
 
+    if code >= 500:
+        ERRORS.inc(source="http")
+
     if data == {}:
         data = None
 
@@ -89,15 +226,31 @@ async def root():
     """Health check endpoint"""
     return ApiResponse(message="RAG-based Financial Statement Q&A System is running", code=200)
 
+@app.get("/ready")
+async def ready():
+    """Readiness check, 200 once the models are loaded and warm, 503 before that or if warm-up failed"""
+    if warmup_task is None or not warmup_task.done():
+        return ApiResponse(message="Warming up", code=503)
+    if warmup_task.cancelled() or warmup_task.exception() is not None:
+        return ApiResponse(message="Warm-up failed", code=503)
+
+    return ApiResponse(
+        message="Ready",
+        code=200,
+        data={
+            "startup_seconds": round(startup_seconds, 3),
+            "warmup": warmup_task.result(),
+            "role": "writer" if _is_writer() else "reader",
+        },
+    )
+
 @app.post("/api/upload")
-async def upload_pdf(file: UploadFile = File(...), db: Session= Depends(db)):
-    """Upload and process PDF file"""
-    # TODO: Implement PDF upload and processing
+async def upload_pdf(file: UploadFile = File(...), db: AsyncSession = Depends(db)):
+    """Upload a PDF and queue it for processing"""
     # 1. Validate file type (PDF)
     # 2. Save uploaded file
-    # 3. Process PDF and extract text
-    # 4. Store documents in vector database
-    # 5. Return processing results
+    # 3. Queue text extraction and embedding as a background job
+    # 4. Return the job id, progress is reported by /api/jobs/{job_id}
 
     try:
         start_time = time.time()
@@ -105,50 +258,122 @@ async def upload_pdf(file: UploadFile = File(...), db: Session= Depends(db)):
         if file.content_type not in static.ALLOWED_EXTENSION:
             raise ApiException(400, message = "Only PDFs are allowed.")
 
-        data = await file.read()    
-        if len(data) >= static.MAX_SIZE:
-            raise ApiException(400, message = "Maximum limit (10MB).")
+        # streamed to a temporary file in the upload directory, hashed on the way
+        staged = await stage_upload(file, settings.pdf_upload_path, settings.max_upload_size)
+
+        # identical bytes were already ingested (or are being ingested), reuse that document,
+        # unless it failed or is being deleted
+        file_hash = staged.sha256
+        existing = await pdf.get_by_hash(file_hash, db, exclude_statuses=[static.STATUS_FAILED, static.STATUS_DELETING])
+        if existing is not None:
+            staged.discard()
+            data = UploadResponse(
+                job_id=existing.uuid,
+                status=existing.status,
+                filename=existing.filename,
+                chunks_count=existing.chunks_count,
+                message="Already uploaded",
+                processing_time=time.time() - start_time,
+            )
+            return ApiResponse(message="Already uploaded", code=200, data=data.model_dump(mode="json"))
         
-        file_path = f"{settings.pdf_upload_path}/{file.filename}"
-
-        with open(file_path, "wb") as f:
-            f.write(data)
-
-        data = pdf_processor.process_pdf(file_path, file.filename)
+        file_path = stored_path(settings.pdf_upload_path, file_hash)
+        staged.commit(file_path)
 
-        chunk_count = len(data)
-
-        pdf.create(
+        record = await pdf.create(
             filename=file.filename,
-            chunks_count=chunk_count,
+            chunks_count=0,
             path=file_path,
-            status="proccess",
+            status=static.STATUS_QUEUED,
             upload_date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            file_hash=file_hash,
             db=db
         )
 
+        status = _queue_ingestion(record)
+
         end_time = time.time()
         elapsed_time = end_time - start_time
-
-        vector_store.add_documents(data)
     except Exception as e:
         logger.error(e)
         raise e
     
     data = UploadResponse(
-        chunks_count=chunk_count,
+        job_id=record.uuid,
+        status=status,
         filename=file.filename,
-        message="Success",
+        message="Queued",
         processing_time=elapsed_time,
     )
 
     return ApiResponse(
-        message="Success",
-        code=200,
+        message="Queued",
+        code=202,
         data=data.model_dump(mode="json")
     )
 
 
+def _queue_ingestion(record: pdf.Pdf) -> str:
+    """Ingest a queued Pdf row here if this is the writer, readers leave it to the writer's sync; returns the job status"""
+    if coordinator.is_writer:
+        return ingestion_queue.submit(record.uuid, record.path, record.filename).status
+    return static.STATUS_QUEUED
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, db: AsyncSession = Depends(db)):
+    """Get the stage and progress of an ingestion job"""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        # jobs from a previous run are only known by their Pdf row
+        record = await pdf.get_by_uuid(job_id, db)
+        if record is None:
+            raise ApiException(404, message="Job not found.")
+
+        upload_date = datetime.strptime(record.upload_date, "%Y-%m-%d %H:%M:%S")
+        job = JobInfo(
+            job_id=record.uuid,
+            filename=record.filename,
+            status=record.status,
+            progress=1.0 if record.status == static.STATUS_READY else 0.0,
+            chunks_count=record.chunks_count,
+            created_at=upload_date,
+            updated_at=upload_date,
+        )
+
+    return ApiResponse(code=200, message="Success", data=job.model_dump(mode="json"))
+
+
+async def _get_session(request: ChatRequest) -> Optional[ChatSession]:
+    """The server-side session a chat request continues, None when the client sends its own history"""
+    if request.session_id is None:
+        return None
+    if request.chat_history:
+        raise ApiException(400, message="Send either session_id or chat_history.")
+
+    session = await chat_sessions.get(request.session_id)
+    if session is None:
+        # never created, deleted, or evicted after being idle
+        raise ApiException(404, message="Chat session not found.")
+    return session
+
+
+def _turn(session: Optional[ChatSession]):
+    """Hold the session for the whole turn, so concurrent questions in one session are answered in order"""
+    return chat_sessions.lock(session.session_id) if session is not None else contextlib.nullcontext()
+
+
+async def _history(request: ChatRequest, session: Optional[ChatSession]):
+    """(chat history, summary of older turns) for the prompt"""
+    if session is None:
+        return request.chat_history, None
+    # read again once the turn is held, the previous turn may have been added meanwhile
+    current = await chat_sessions.get(session.session_id)
+    if current is not None:
+        session.summary, session.turns = current.summary, current.turns
+    return list(session.turns), session.summary
+
+
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
     """Process chat request and return AI response"""
@@ -157,8 +382,16 @@ async def chat(request: ChatRequest):
     # 2. Use RAG pipeline to generate answer
     # 3. Return response with sources
 
+    session = await _get_session(request)
     start_time = time.time()
-    rag_result = rag_pipeline.generate_answer(question=request.question, chat_history=request.chat_history)
+    with collect_timings() as timings:
+        async with _turn(session):
+            chat_history, history_summary = await _history(request, session)
+            rag_result = await rag_pipeline.agenerate_answer(
+                question=request.question, chat_history=chat_history, filter=request.filter, history_summary=history_summary
+            )
+            if session is not None:
+                await chat_sessions.add_turn(session, request.question, rag_result["answer"], rag_pipeline.asummarize)
 
     end_time = time.time()
     elapsed_time = end_time - start_time
@@ -166,20 +399,146 @@ async def chat(request: ChatRequest):
     response = ChatResponse(
         answer=rag_result["answer"],
         sources=rag_result["sources"],
-        processing_time=elapsed_time
+        processing_time=elapsed_time,
+        context_stats=rag_result.get("context_stats"),
+        timings=timings if request.include_timings else None,
+        session_id=request.session_id,
     )
 
     return ApiResponse(code=200, message="Success", data=response.model_dump(mode="json"))
 
 
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """Stream the answer as Server-Sent Events: sources, then tokens, then done"""
+    # a session turn is only recorded once its answer was streamed completely
+    session = await _get_session(request)
+
+    async def events():
+        async with _turn(session):
+            chat_history, history_summary = await _history(request, session)
+            stream = rag_pipeline.astream_answer(
+                question=request.question, chat_history=chat_history, filter=request.filter, history_summary=history_summary
+            )
+            tokens: List[str] = []
+            try:
+                with collect_timings() as timings:
+                    async for item in stream:
+                        if await http_request.is_disconnected():
+                            logger.info("Client disconnected, cancelling chat stream")
+                            break
+                        if item["event"] == "token":
+                            tokens.append(item["data"])
+                        if item["event"] == "done":
+                            if request.include_timings:
+                                item["data"]["timings"] = timings
+                            if session is not None:
+                                await chat_sessions.add_turn(session, request.question, "".join(tokens), rag_pipeline.asummarize)
+                                item["data"]["session_id"] = session.session_id
+                        yield SseEvent(item["event"], item["data"])
+            except Exception as e:
+                logger.error(e)
+                ERRORS.inc(source="chat_stream")
+                yield SseEvent("error", {"message": "Sorry, an error occurred while processing your request."})
+            finally:
+                await stream.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/chat/sessions")
+async def create_chat_session():
+    """Start a server-side chat session, pass its session_id to /api/chat or /api/chat/stream"""
+    session = await chat_sessions.create()
+    return ApiResponse(code=201, message="Created", data=ChatSessionInfo(**session.info()).model_dump(mode="json"))
+
+
+@app.get("/api/chat/sessions/{session_id}")
+async def get_chat_session(session_id: str):
+    """Get the summary and the recent turns of a chat session"""
+    session = await chat_sessions.get(session_id)
+    if session is None:
+        raise ApiException(404, message="Chat session not found.")
+    return ApiResponse(code=200, message="Success", data=ChatSessionInfo(**session.info()).model_dump(mode="json"))
+
+
+@app.delete("/api/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    """End a chat session and forget its history"""
+    if not await chat_sessions.delete(session_id):
+        raise ApiException(404, message="Chat session not found.")
+    return ApiResponse(code=200, message="Deleted", data={"session_id": session_id})
+
+
+@app.post("/api/chat/batch")
+async def chat_batch(request: BatchChatRequest, http_request: Request):
+    """Answer many standalone questions, streamed as Server-Sent Events: an answer (or error) per question as it completes, then done"""
+    # - each event carries the index of its question in the request
+    # - answers arrive in completion order, not request order
+    if not request.questions:
+        raise ApiException(400, message="No questions.")
+    if len(request.questions) > settings.chat_batch_max_questions:
+        raise ApiException(400, message=f"At most {settings.chat_batch_max_questions} questions per batch.")
+    if any(not question.strip() for question in request.questions):
+        raise ApiException(400, message="Questions must not be empty.")
+
+    async def events():
+        stream = rag_pipeline.abatch_answers(questions=request.questions, filter=request.filter)
+        try:
+            with collect_timings() as timings:
+                async for item in stream:
+                    if await http_request.is_disconnected():
+                        logger.info("Client disconnected, cancelling chat batch")
+                        break
+                    if item["event"] == "done" and request.include_timings:
+                        item["data"]["timings"] = timings
+                    yield SseEvent(item["event"], item["data"])
+        except Exception as e:
+            logger.error(e)
+            ERRORS.inc(source="chat_batch")
+            yield SseEvent("error", {"message": "Sorry, an error occurred while processing your request."})
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: stage latency histograms, chunk/token/error counters, cache gauges"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Get answer cache hit rate and hit latency"""
+    return ApiResponse(code=200, message="Success", data=rag_pipeline.answer_cache.stats())
+
+
 @app.get("/api/documents")
-async def get_documents(db: Session= Depends(db)):
+async def get_documents(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    filename: Optional[str] = None,
+    status: Optional[str] = None,
+    db: AsyncSession = Depends(db),
+):
     """Get list of processed documents"""
     # TODO: Implement document listing
-    # - Return list of uploaded and processed documents
+    # - Return list of uploaded and processed documents, newest first
+    # - Paginated with offset/limit, filterable by filename and status
 
-    pdfs = pdf.get_all(db)
+    pdfs, total_count = await pdf.get_page(db, offset=offset, limit=limit, filename=filename, status=status)
     documentInfo = [DocumentInfo(
+        uuid=doc.uuid,
         filename=doc.filename,
         chunks_count=doc.chunks_count,
         status=doc.status,
@@ -189,21 +548,109 @@ async def get_documents(db: Session= Depends(db)):
     ) for doc in pdfs]
 
     documentResponse = DocumentsResponse(
-        documents = documentInfo
+        documents = documentInfo,
+        total_count = total_count,
+        offset = offset,
+        limit = limit,
+        next_offset = offset + len(pdfs) if offset + len(pdfs) < total_count else None,
     )
 
     return ApiResponse(code=200, message="Success", data=documentResponse.model_dump(mode="json"))
 
 
+async def _get_idle_document(document_id: str, db: AsyncSession) -> pdf.Pdf:
+    record = await pdf.get_by_uuid(document_id, db)
+    if record is None:
+        raise ApiException(404, message="Document not found.")
+    if record.status in static.STATUSES_IN_PROGRESS:
+        raise ApiException(409, message="Document is being processed.")
+    return record
+
+
+@app.delete("/api/documents/{document_id}")
+async def delete_document(document_id: str, db: AsyncSession = Depends(db)):
+    """Delete a document, its chunks and, unless another document uses it, its PDF file"""
+    record = await _get_idle_document(document_id, db)
+    if not coordinator.is_writer:
+        # the writer worker deletes it on its next sync
+        await pdf.update_status(record.uuid, static.STATUS_DELETING, db)
+        return ApiResponse(code=202, message="Queued", data={"uuid": record.uuid, "status": static.STATUS_DELETING})
+
+    chunks_deleted = await ingestion_queue.delete(record, db)
+    return ApiResponse(code=200, message="Deleted", data={"uuid": record.uuid, "chunks_deleted": chunks_deleted})
+
+
+@app.post("/api/documents/{document_id}/reindex")
+async def reindex_document(document_id: str, file: Optional[UploadFile] = File(None), db: AsyncSession = Depends(db)):
+    """Re-index a document, optionally replacing its PDF first; only chunks whose text changed are embedded again"""
+    start_time = time.time()
+    record = await _get_idle_document(document_id, db)
+
+    if file is not None:
+        if file.content_type not in static.ALLOWED_EXTENSION:
+            raise ApiException(400, message="Only PDFs are allowed.")
+
+        staged = await stage_upload(file, settings.pdf_upload_path, settings.max_upload_size)
+        old_path, file_path = record.path, stored_path(settings.pdf_upload_path, staged.sha256)
+        staged.commit(file_path)
+        record = await pdf.update_file(record.uuid, file_path, staged.sha256, db)
+        # the replaced file may still belong to another document
+        if old_path != file_path and await pdf.count_by_path(old_path, db) == 0 and os.path.exists(old_path):
+            os.remove(old_path)
+    elif not os.path.exists(record.path):
+        raise ApiException(404, message="PDF file not found, upload it again.")
+
+    if coordinator.is_writer:
+        status = (await ingestion_queue.reindex(record, db)).status
+    else:
+        # chunks_count stays, it tells the writer's sync that this is a re-index
+        await pdf.update_status(record.uuid, static.STATUS_QUEUED, db)
+        status = static.STATUS_QUEUED
+
+    data = UploadResponse(
+        job_id=record.uuid,
+        status=status,
+        filename=record.filename,
+        message="Queued",
+        processing_time=time.time() - start_time,
+    )
+    return ApiResponse(message="Queued", code=202, data=data.model_dump(mode="json"))
+
+
 @app.get("/api/chunks")
-async def get_chunks():
-    """Get document chunks (optional endpoint)"""
-    # TODO: Implement chunk listing
-    # - Return document chunks with metadata
-    list_chunk = vector_store.get_all_document()
+async def get_chunks(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    filename: Optional[str] = None,
+    page: Optional[int] = None,
+    include_content: bool = True,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """Get document chunks, paginated and filterable by filename and page"""
+    # - format=ndjson streams every matching chunk (offset/limit are ignored), for bulk export
+    # - include_content=false returns metadata only
+    if format == "ndjson":
+        def lines():
+            for chunk in vector_store.iter_chunks(filename=filename, page=page, include_content=include_content):
+                yield json.dumps(chunk.model_dump(mode="json")) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    list_chunk, total_count = await asyncio.to_thread(
+        vector_store.get_chunks,
+        offset=offset,
+        limit=limit,
+        filename=filename,
+        page=page,
+        include_content=include_content,
+    )
+    next_offset = offset + len(list_chunk)
     data = ChunksResponse(
         chunks=list_chunk,
-        total_count=len(list_chunk)
+        total_count=total_count,
+        offset=offset,
+        limit=limit,
+        next_offset=next_offset if next_offset < total_count else None,
     )
     
     return ApiResponse(code=200, message="Success", data=data.model_dump(mode="json"))
@@ -211,4 +658,8 @@ async def get_chunks():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host=settings.host, port=settings.port, reload=settings.debug) 
\ No newline at end of file
+    if settings.workers > 1:
+        # worker processes import the app themselves, reload is single-process only
+        uvicorn.run("main:app", host=settings.host, port=settings.port, workers=settings.workers)
+    else:
+        uvicorn.run(app, host=settings.host, port=settings.port, reload=settings.debug) 
\ No newline at end of file
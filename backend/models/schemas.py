@@ -3,15 +3,50 @@ from pydantic import BaseModel
 from datetime import datetime
 
 
+class RetrievalFilter(BaseModel):
+    filenames: Optional[List[str]] = None
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+
+
 class ChatRequest(BaseModel):
     question: str
     chat_history: Optional[List[Dict[str, str]]] = []
+    # server-side history from /api/chat/sessions, instead of sending chat_history every turn
+    session_id: Optional[str] = None
+    # restrict retrieval to some documents and/or a page range
+    filter: Optional[RetrievalFilter] = None
+    # report per-stage durations (seconds) in the response
+    include_timings: bool = False
+
+
+class BatchChatRequest(BaseModel):
+    # standalone questions, answered without chat history
+    questions: List[str]
+    filter: Optional[RetrievalFilter] = None
+    include_timings: bool = False
+
+
+class ChunkMetadata(BaseModel):
+    """What the vector store keeps next to every chunk, the page text itself is not repeated"""
+    doc_id: Optional[str] = None
+    filename: str
+    page: int
+    chunk_index: int
+    # character offsets of the chunk in its page text, absent for table chunks
+    start: Optional[int] = None
+    end: Optional[int] = None
+    # "table" for chunks built from a table in layout mode
+    content_type: Optional[str] = None
 
 
 class DocumentSource(BaseModel):
     content: str
     page: int
+    # vector distance (lower is better), or the cross-encoder score (higher is better) with RERANK
     score: float
+    # reciprocal rank fusion score (higher is better) with HYBRID_SEARCH
+    fused_score: Optional[float] = None
     metadata: Optional[Dict[str, Any]] = {}
 
 
@@ -19,9 +54,24 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[DocumentSource]
     processing_time: float
+    # retrieved_chunks, context_chunks, context_tokens, tokens_saved
+    context_stats: Optional[Dict[str, int]] = None
+    timings: Optional[Dict[str, float]] = None
+    session_id: Optional[str] = None
+
+
+class ChatSessionInfo(BaseModel):
+    session_id: str
+    # older turns, folded into a summary
+    summary: str = ""
+    # recent turns not summarized yet, oldest first
+    turns: List[Dict[str, str]] = []
+    turn_count: int = 0
+    created_at: datetime
 
 
 class DocumentInfo(BaseModel):
+    uuid: Optional[str] = None
     filename: str
     upload_date: datetime
     chunks_count: int
@@ -31,22 +81,47 @@ class DocumentInfo(BaseModel):
 
 class DocumentsResponse(BaseModel):
     documents: List[DocumentInfo]
+    total_count: int = 0
+    offset: int = 0
+    limit: int = 0
+    # offset of the next page, None on the last page
+    next_offset: Optional[int] = None
 
 
 class UploadResponse(BaseModel):
     message: str
     filename: str
-    chunks_count: int
+    job_id: str
+    status: str
+    chunks_count: int = 0
     processing_time: float
 
 
+class JobInfo(BaseModel):
+    job_id: str
+    filename: str
+    status: str
+    progress: float = 0.0
+    chunks_count: int = 0
+    # chunks whose text matched the previous indexing and were not embedded again
+    chunks_unchanged: int = 0
+    error: Optional[str] = None
+    # seconds spent per ingestion stage (extract_page, split, embed_batch, vector_insert)
+    timings: Optional[Dict[str, float]] = None
+    created_at: datetime
+    updated_at: datetime
+
+
 class ChunkInfo(BaseModel):
     id: str
-    content: str
+    content: Optional[str] = None
     page: int
     metadata: Dict[str, Any]
 
 
 class ChunksResponse(BaseModel):
     chunks: List[ChunkInfo]
-    total_count: int 
\ No newline at end of file
+    total_count: int
+    offset: int = 0
+    limit: Optional[int] = None
+    next_offset: Optional[int] = None 
\ No newline at end of file
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import threading
+import time
+import numpy as np
+from config import settings
+
+
+class SemanticAnswerCache:
+    """LRU/TTL cache of answers keyed by question embedding.
+
+    A question hits when its embedding is within `max_distance` cosine
+    distance of a cached question asked with the same scope (retrieval
+    filter). The whole cache is dropped whenever the vector store changes,
+    see `invalidate`.
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None, max_distance: float = None):
+        self.max_entries = settings.answer_cache_size if max_entries is None else max_entries
+        self.ttl = settings.answer_cache_ttl if ttl is None else ttl
+        self.max_distance = settings.answer_cache_max_distance if max_distance is None else max_distance
+
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self.next_key = 0
+        # bumped on every invalidation so answers computed against an older store are not stored
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.hit_latency_total = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def lookup(self, embedding: List[float], started: float = None, scope: str = "") -> Optional[Dict[str, Any]]:
+        """Return the cached result closest to `embedding` within `scope`, or None on a miss"""
+        started = started or time.perf_counter()
+        query = _normalize(embedding)
+
+        with self.lock:
+            self._expire()
+            best_key, best_distance = None, None
+            keys = [key for key, entry in self.entries.items() if entry["scope"] == scope]
+            if keys:
+                matrix = np.stack([self.entries[key]["embedding"] for key in keys])
+                distances = 1.0 - matrix @ query
+                index = int(np.argmin(distances))
+                best_key, best_distance = keys[index], float(distances[index])
+
+            if best_key is None or best_distance > self.max_distance:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(best_key)
+            self.hits += 1
+            self.hit_latency_total += time.perf_counter() - started
+            return self.entries[best_key]["result"]
+
+    def store(self, embedding: List[float], result: Dict[str, Any], generation: int, scope: str = "") -> None:
+        """Cache `result`, unless the store changed since `generation` was read"""
+        with self.lock:
+            if generation != self.generation:
+                return
+
+            self.entries[self.next_key] = {
+                "embedding": _normalize(embedding),
+                "result": result,
+                "scope": scope,
+                "created_at": time.monotonic(),
+            }
+            self.next_key += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_hit_latency_ms": 1000 * self.hit_latency_total / self.hits if self.hits else 0.0,
+            }
+
+    def _expire(self) -> None:
+        if self.ttl <= 0:
+            return
+
+        deadline = time.monotonic() - self.ttl
+        # entries are kept in insertion/use order, but TTL counts from creation
+        expired = [key for key, entry in self.entries.items() if entry["created_at"] < deadline]
+        for key in expired:
+            del self.entries[key]
+
+
+def _normalize(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
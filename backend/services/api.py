@@ -1,3 +1,4 @@
+import json
 from fastapi.responses import JSONResponse
 
 def ApiResponse(message, code=200, **kwargs):
@@ -15,4 +16,8 @@ class ApiException(Exception):
         self.message = message
         self.data = kwagrs
 
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+def SseEvent(event: str, data=None) -> str:
+    """Format one Server-Sent Events frame with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
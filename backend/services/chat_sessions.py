@@ -0,0 +1,193 @@
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+from weakref import WeakValueDictionary
+import asyncio
+import time
+from services.metrics import ERRORS
+from sqlite.database import session as db_session
+from sqlite.models import chat_session
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# summarize(previous summary, turns to fold in) -> new summary
+Summarizer = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+# how long a worker may take to summarize a session before another one may try, in case it died
+SUMMARY_LEASE_SECONDS = 120.0
+
+
+class ChatSession:
+    """One conversation as last read from the database: a summary of its older turns and the recent turns verbatim"""
+
+    def __init__(self, session_id: str, summary: str = "", turns: List[Dict[str, str]] = None, turn_count: int = 0, created_at: datetime = None):
+        self.session_id = session_id
+        self.summary = summary
+        # turns not folded into the summary yet, oldest first
+        self.turns: List[Dict[str, str]] = turns or []
+        self.turn_count = turn_count
+        self.created_at = created_at or datetime.now()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "summary": self.summary,
+            "turns": list(self.turns),
+            "turn_count": self.turn_count,
+            "created_at": self.created_at,
+        }
+
+
+class ChatSessionStore:
+    """Server-side chat sessions with bounded storage.
+
+    Sessions live in the database, so a follow-up question may land on any
+    worker. The prompt of a turn holds the session summary and the turns not
+    folded into it yet. Once `window` turns are waiting beyond the most
+    recent `window`, the older ones are summarized by the LLM in the
+    background, by whichever worker claims the session first, so a prompt
+    carries between `window` and 2 * `window` - 1 turns plus a summary of at
+    most chat_summary_max_tokens, however long the conversation. Sessions
+    idle for `ttl` seconds expire, and the least recently used are evicted
+    beyond `max_sessions` or `max_bytes`.
+
+    Questions of one session are answered in order within a worker; two
+    asked at once on different workers may not see each other's turn.
+    """
+
+    def __init__(self, window: int = None, max_sessions: int = None, max_bytes: int = None, ttl: float = None):
+        self.window = settings.chat_session_window if window is None else window
+        self.max_sessions = settings.chat_session_max_count if max_sessions is None else max_sessions
+        self.max_bytes = settings.chat_session_max_bytes if max_bytes is None else max_bytes
+        self.ttl = settings.chat_session_ttl if ttl is None else ttl
+
+        # one per session in use in this worker
+        self.locks: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
+        # running summaries by session id, kept referenced until done
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.evictions = 0
+        # as of the last eviction check, for the gauges
+        self.counts = {"sessions": 0, "bytes": 0}
+
+    async def create(self) -> ChatSession:
+        created_at = datetime.now()
+        async with db_session() as db:
+            record = await chat_session.create(str(uuid4()), created_at.isoformat(), time.time(), db)
+        await self._evict(keep=record.session_id)
+        return ChatSession(record.session_id, created_at=created_at)
+
+    async def get(self, session_id: str) -> Optional[ChatSession]:
+        await self._expire()
+        async with db_session() as db:
+            record = await chat_session.get(session_id, db)
+            if record is None:
+                return None
+            await chat_session.touch(session_id, time.time(), db)
+            turns = await chat_session.get_turns(session_id, db)
+        return ChatSession(
+            record.session_id,
+            summary=record.summary,
+            turns=[{"user": turn.user, "assistant": turn.assistant} for turn in turns],
+            turn_count=record.turn_count,
+            created_at=datetime.fromisoformat(record.created_at),
+        )
+
+    async def delete(self, session_id: str) -> bool:
+        task = self.tasks.pop(session_id, None)
+        if task is not None:
+            task.cancel()
+        async with db_session() as db:
+            return await chat_session.delete([session_id], db) > 0
+
+    def lock(self, session_id: str) -> asyncio.Lock:
+        """Held for a whole turn, so concurrent questions in one session are answered in order"""
+        lock = self.locks.get(session_id)
+        if lock is None:
+            lock = self.locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def add_turn(self, session: ChatSession, question: str, answer: str, summarize: Summarizer) -> None:
+        """Record a finished turn, and start folding old turns into the summary when enough are waiting"""
+        async with db_session() as db:
+            waiting = await chat_session.add_turn(session.session_id, question, answer, time.time(), db)
+        if waiting is None:
+            # deleted or evicted while the answer was generated
+            return
+
+        session.turns.append({"user": question, "assistant": answer})
+        session.turn_count += 1
+        if waiting >= 2 * self.window and session.session_id not in self.tasks:
+            task = asyncio.create_task(self._summarize(session.session_id, summarize))
+            self.tasks[session.session_id] = task
+            task.add_done_callback(lambda _: self.tasks.pop(session.session_id, None))
+        await self._evict(keep=session.session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counts, "evictions": self.evictions}
+
+    async def close(self) -> None:
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _summarize(self, session_id: str, summarize: Summarizer) -> None:
+        async with db_session() as db:
+            now = time.time()
+            if not await chat_session.claim_summary(session_id, now, now + SUMMARY_LEASE_SECONDS, db):
+                # another worker is folding this session
+                return
+            record = await chat_session.get(session_id, db)
+            # turns added meanwhile stay in the window, only this prefix is replaced
+            turns = await chat_session.get_turns(session_id, db)
+
+        folded = turns[:len(turns) - self.window]
+        try:
+            if record is None or not folded:
+                summary = None
+            else:
+                # no connection is held while the LLM works
+                summary = await summarize(record.summary, [{"user": turn.user, "assistant": turn.assistant} for turn in folded])
+        except asyncio.CancelledError:
+            # the lease runs out, a later turn tries again
+            raise
+        except Exception as e:
+            # the turns stay, the next turn tries again
+            logger.error(f"Summarizing chat session {session_id} failed: {e}")
+            ERRORS.inc(source="chat_summary")
+            summary = None
+
+        async with db_session() as db:
+            if summary is None:
+                await chat_session.release_summary(session_id, db)
+            else:
+                await chat_session.fold(session_id, summary, folded[-1].id, db)
+
+    async def _expire(self) -> None:
+        if self.ttl <= 0:
+            return
+
+        async with db_session() as db:
+            await chat_session.delete_idle(time.time() - self.ttl, db)
+
+    async def _evict(self, keep: str) -> None:
+        await self._expire()
+        async with db_session() as db:
+            # least recently used first
+            sessions = await chat_session.sizes(db)
+            total = sum(size for _, _, size in sessions)
+            evicted = []
+            # the session in use is never evicted, even when it alone is over max_bytes
+            for session_id, _, size in sessions:
+                if len(sessions) - len(evicted) <= max(self.max_sessions, 1) and total <= self.max_bytes:
+                    break
+                if session_id == keep:
+                    continue
+                evicted.append(session_id)
+                total -= size
+            if evicted:
+                await chat_session.delete(evicted, db)
+                self.evictions += len(evicted)
+        self.counts = {"sessions": len(sessions) - len(evicted), "bytes": total}
@@ -0,0 +1,113 @@
+from typing import Dict, List, Set, Tuple
+from models.schemas import DocumentSource
+from config import settings
+
+# shortest shared text treated as splitter overlap rather than coincidence
+MIN_OVERLAP = 20
+SHINGLE_SIZE = 5
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting"""
+    return (len(text) + 3) // 4
+
+
+class ContextBuilder:
+    """Assemble the LLM context from ranked chunks within a token budget.
+
+    Neighbouring chunks from the same page that share the splitter overlap
+    are merged into one passage, near-duplicate passages are dropped, and the
+    rest are packed in rank order until the budget is used up.
+    """
+
+    def __init__(self, token_budget: int = None, duplicate_threshold: float = None):
+        self.token_budget = settings.context_token_budget if token_budget is None else token_budget
+        self.duplicate_threshold = settings.context_duplicate_threshold if duplicate_threshold is None else duplicate_threshold
+
+    def build(self, documents: List[DocumentSource]) -> Tuple[str, Dict[str, int]]:
+        """Return the context string and token accounting for this request"""
+        naive_tokens = sum(estimate_tokens(self._format(document.page, document.content)) for document in documents)
+
+        passages = self._deduplicate(self._merge_overlaps(documents))
+
+        parts: List[str] = []
+        used_tokens = 0
+        for page, content in passages:
+            part = self._format(page, content)
+            tokens = estimate_tokens(part)
+            # skip what does not fit, a later and shorter passage still might
+            if self.token_budget > 0 and used_tokens + tokens > self.token_budget:
+                continue
+            parts.append(part)
+            used_tokens += tokens
+
+        stats = {
+            "retrieved_chunks": len(documents),
+            "context_chunks": len(parts),
+            "context_tokens": used_tokens,
+            "tokens_saved": max(0, naive_tokens - used_tokens),
+        }
+        return "\n\n".join(parts), stats
+
+    def _format(self, page: int, content: str) -> str:
+        return f"[Source: Page {page}] {content}"
+
+    def _merge_overlaps(self, documents: List[DocumentSource]) -> List[Tuple[int, str]]:
+        """Merge chunks of the same page that overlap, at the position of the best ranked part"""
+        passages: List[Tuple[Tuple[str, int], str]] = []
+        for document in documents:
+            key = (document.metadata.get("filename", ""), document.page)
+            passages.append((key, document.content))
+
+            # the new passage may join an earlier one, and the joined passage may
+            # then bridge to a third, so merge until nothing on this page overlaps
+            merged = True
+            while merged:
+                merged = False
+                for first in range(len(passages)):
+                    for second in range(first + 1, len(passages)):
+                        if passages[first][0] != key or passages[second][0] != key:
+                            continue
+                        a, b = passages[first][1], passages[second][1]
+                        combined = self._join(a, b) or self._join(b, a)
+                        if combined is not None:
+                            passages[first] = (key, combined)
+                            del passages[second]
+                            merged = True
+                            break
+                    if merged:
+                        break
+
+        return [(key[1], content) for key, content in passages]
+
+    def _join(self, first: str, second: str):
+        """first + second without the shared overlap, None when they do not overlap"""
+        if second in first:
+            return first
+        limit = min(len(first), len(second), 2 * settings.chunk_overlap)
+        for size in range(limit, MIN_OVERLAP - 1, -1):
+            if first.endswith(second[:size]):
+                return first + second[size:]
+        return None
+
+    def _deduplicate(self, passages: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+        kept: List[Tuple[int, str]] = []
+        kept_shingles: List[Set[Tuple[str, ...]]] = []
+        for page, content in passages:
+            shingles = self._shingles(content)
+            if any(self._similarity(shingles, other) >= self.duplicate_threshold for other in kept_shingles):
+                continue
+            kept.append((page, content))
+            kept_shingles.append(shingles)
+        return kept
+
+    def _shingles(self, text: str) -> Set[Tuple[str, ...]]:
+        words = text.lower().split()
+        if len(words) < SHINGLE_SIZE:
+            return {tuple(words)}
+        return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+    def _similarity(self, first: Set, second: Set) -> float:
+        if not first or not second:
+            return 0.0
+        return len(first & second) / len(first | second)
@@ -0,0 +1,181 @@
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Callable, List, Optional
+import multiprocessing
+import os
+import threading
+from langchain_core.embeddings import Embeddings
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def build_local_embeddings(batch_size: int = None, threads: int = None) -> Embeddings:
+    """Load the sentence-transformers model in this process with explicit batch and thread settings"""
+    if settings.embedding_backend == "fake":
+        from services.fake_backends import HashingEmbeddings
+        return HashingEmbeddings()
+
+    # langchain_huggingface pulls in torch and sentence-transformers, only import them when a model is loaded
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    threads = settings.embedding_threads if threads is None else threads
+    if threads > 0:
+        import torch
+        torch.set_num_threads(threads)
+
+    return HuggingFaceEmbeddings(
+        model_name=settings.embedding_model,
+        model_kwargs={"device": settings.embedding_device},
+        encode_kwargs={"batch_size": batch_size or settings.embedding_batch_size},
+    )
+
+
+class LazyEmbeddings(Embeddings):
+    """Build the wrapped embeddings on first use, so constructing services does not load a model"""
+
+    def __init__(self, factory: Callable[[], Embeddings]):
+        self.factory = factory
+        self.embeddings: Optional[Embeddings] = None
+        self.lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.embeddings is not None
+
+    def load(self) -> Embeddings:
+        with self.lock:
+            if self.embeddings is None:
+                self.embeddings = self.factory()
+            return self.embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return (self.embeddings or self.load()).embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return (self.embeddings or self.load()).embed_query(text)
+
+
+def _serve(address: Optional[str], authkey: bytes, ready: Connection) -> None:
+    """Embedding worker process entry point"""
+    embeddings = build_local_embeddings()
+    # first call pays for lazy initialisation, do it before accepting work
+    embeddings.embed_query("warm up")
+    lock = threading.Lock()
+
+    def handle(connection: Connection) -> None:
+        with connection:
+            while True:
+                try:
+                    kind, payload = connection.recv()
+                except EOFError:
+                    return
+
+                try:
+                    with lock:
+                        if kind == "query":
+                            result = embeddings.embed_query(payload)
+                        else:
+                            result = embeddings.embed_documents(payload)
+                    connection.send(("ok", result))
+                except Exception as e:
+                    connection.send(("error", str(e)))
+
+    with Listener(address, authkey=authkey) as listener:
+        ready.send(listener.address)
+        ready.close()
+        while True:
+            connection = listener.accept()
+            threading.Thread(target=handle, args=(connection,), daemon=True).start()
+
+
+class EmbeddingWorker:
+    """Dedicated process that keeps the embedding model loaded.
+
+    Ingestion and query embedding both talk to it over a local socket, so the
+    model is loaded and warmed once instead of in every thread or service.
+    With EMBEDDING_WORKER_ADDRESS and EMBEDDING_WORKER_AUTHKEY set, the other
+    uvicorn workers connect to the writer's worker instead of loading the
+    model themselves.
+    """
+
+    def __init__(self, address: str = None, authkey: str = None):
+        self.address = address or settings.embedding_worker_address or None
+        authkey = authkey or settings.embedding_worker_authkey
+        self.authkey = authkey.encode() if authkey else os.urandom(16)
+        # a known address and key, other processes can connect
+        self.shared = self.address is not None and bool(authkey)
+        self.process: Optional[multiprocessing.Process] = None
+
+    def is_serving(self) -> bool:
+        """Whether a worker answers at the address, e.g. one started by another process"""
+        if self.address is None:
+            return False
+        try:
+            Client(self.address, authkey=self.authkey).close()
+            return True
+        except (OSError, EOFError, AuthenticationError):
+            return False
+
+    def start(self) -> None:
+        if self.shared and self.is_serving():
+            logger.info(f"Using the embedding worker already serving on {self.address}")
+            return
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            # socket file left behind by a worker that did not exit cleanly
+            os.remove(self.address)
+
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=_serve, args=(self.address, self.authkey, sender), name="embedding-worker", daemon=True
+        )
+        self.process.start()
+        sender.close()
+        try:
+            self.address = receiver.recv()
+        except EOFError:
+            raise RuntimeError("Embedding worker exited during startup")
+        finally:
+            receiver.close()
+        logger.info(f"Embedding worker ready on {self.address}")
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=5)
+        self.process = None
+
+
+class WorkerEmbeddings(Embeddings):
+    """Embeddings client for an EmbeddingWorker, one connection per thread"""
+
+    def __init__(self, worker: EmbeddingWorker):
+        self.worker = worker
+        self.local = threading.local()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._request("documents", list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._request("query", text)
+
+    def _request(self, kind: str, payload):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = Client(self.worker.address, authkey=self.worker.authkey)
+            self.local.connection = connection
+
+        try:
+            connection.send((kind, payload))
+            status, result = connection.recv()
+        except (EOFError, OSError):
+            self.local.connection = None
+            raise
+
+        if status != "ok":
+            raise RuntimeError(f"Embedding worker error: {result}")
+        return result
@@ -0,0 +1,116 @@
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+import asyncio
+import hashlib
+import math
+import time
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from services.lexical_index import tokenize
+from config import settings
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic offline embeddings for benchmarks and local runs.
+
+    Tokens are feature-hashed into a fixed number of dimensions, so texts that
+    share words are close in cosine distance and no model has to be loaded.
+    """
+
+    def __init__(self, dimensions: int = None):
+        self.dimensions = dimensions or settings.fake_embedding_dimensions
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in tokenize(text):
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+
+        norm = math.sqrt(sum(value * value for value in vector))
+        if not norm:
+            # empty text still needs a valid direction
+            vector[0], norm = 1.0, 1.0
+        return [value / norm for value in vector]
+
+
+class FakeLLM(LLM):
+    """Deterministic stand-in for the LLM endpoint with configurable latency.
+
+    The answer is the first `answer_tokens` words of the prompt's context, so
+    completion length and streaming behave like a real answer. `latency` is
+    the time to the first token, `tokens_per_second` paces the rest (0 = all
+    at once).
+    """
+
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+    answer_tokens: int = 64
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        time.sleep(self.latency + self._generation_time())
+        return " ".join(self._answer_words(prompt))
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        await asyncio.sleep(self.latency + self._generation_time())
+        return " ".join(self._answer_words(prompt))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        time.sleep(self.latency)
+        for index, word in enumerate(self._answer_words(prompt)):
+            if index and self.tokens_per_second > 0:
+                time.sleep(1 / self.tokens_per_second)
+            yield GenerationChunk(text=word if not index else f" {word}")
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for index, word in enumerate(self._answer_words(prompt)):
+            if index and self.tokens_per_second > 0:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield GenerationChunk(text=word if not index else f" {word}")
+
+    def _generation_time(self) -> float:
+        return self.answer_tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _answer_words(self, prompt: str) -> List[str]:
+        context = prompt.split("Context:", 1)[-1].split("Question:", 1)[0]
+        words = context.split() or ["No", "context."]
+        return words[:self.answer_tokens]
+
+
+class OverlapCrossEncoder:
+    """Deterministic stand-in for a sentence-transformers CrossEncoder.
+
+    Scores a (query, passage) pair by the share of query tokens found in the
+    passage, and sleeps `latency` seconds per pair to model inference cost.
+    """
+
+    def __init__(self, latency: float = None):
+        self.latency = settings.fake_reranker_latency if latency is None else latency
+
+    def predict(self, pairs: List[Tuple[str, str]], batch_size: int = 32) -> List[float]:
+        time.sleep(self.latency * len(pairs))
+        scores = []
+        for query, passage in pairs:
+            terms = set(tokenize(query))
+            found = set(tokenize(passage))
+            scores.append(len(terms & found) / len(terms) if terms else 0.0)
+        return scores
+
+
+def build_fake_llm() -> FakeLLM:
+    return FakeLLM(
+        latency=settings.fake_llm_latency,
+        tokens_per_second=settings.fake_llm_tokens_per_second,
+        answer_tokens=settings.fake_llm_answer_tokens,
+    )
@@ -0,0 +1,276 @@
+import asyncio
+import contextvars
+import hashlib
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+from langchain_core.documents import Document
+from services.pdf_processor import PDFProcessor
+from services.vector_store import VectorStoreService
+from services.metrics import CHUNKS, ERRORS, collect_timings
+from models.schemas import JobInfo
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlite.database import session
+from sqlite.models import chunk, pdf
+from config import settings
+import logging
+import static
+
+logger = logging.getLogger(__name__)
+
+# finished jobs kept in memory, older ones are still answered from the Pdf table
+MAX_FINISHED_JOBS = 1000
+
+# extracted batches waiting for embedding, bounds memory per job
+PIPELINE_DEPTH = 2
+
+_DONE = object()
+
+
+def content_hash(document: Document) -> str:
+    return hashlib.sha1(document.page_content.encode("utf-8")).hexdigest()
+
+
+class IngestionQueue:
+    """Run PDF extraction and embedding off the request path.
+
+    Uploads are queued and picked up by a fixed number of worker tasks; the
+    blocking pdfplumber and embedding work runs in a thread pool so the event
+    loop keeps serving other requests while a document is being ingested.
+    Within a job, pages are extracted and chunked in a producer thread while
+    earlier batches are embedded, with at most PIPELINE_DEPTH batches buffered.
+
+    Chunk ids are derived from the document id, page and position, and every
+    chunk is recorded in the chunks table with a hash of its text. Running a
+    job again for the same document (re-indexing) only embeds chunks whose
+    text changed and deletes the chunks that no longer exist.
+
+    Only the writer worker runs a queue (see services/workers.py); sync()
+    picks up the documents that reader workers queued or marked for deletion.
+    """
+
+    def __init__(self, pdf_processor: PDFProcessor, vector_store: VectorStoreService, workers: int = None):
+        self.pdf_processor = pdf_processor
+        self.vector_store = vector_store
+        self.workers = workers or settings.ingestion_workers
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingestion")
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.jobs: Dict[str, JobInfo] = {}
+        self.tasks: List[asyncio.Task] = []
+        # set in start(), pipeline threads schedule status writes on it
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self) -> None:
+        """Spawn the worker tasks and fail jobs interrupted by a previous shutdown"""
+        self.loop = asyncio.get_running_loop()
+        await self._fail_interrupted()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, job_id: str, file_path: str, filename: str) -> JobInfo:
+        """Queue a saved PDF for ingestion and return its job, the running one if it is queued already"""
+        existing = self._active(job_id)
+        if existing is not None:
+            return existing
+
+        now = datetime.now()
+        job = JobInfo(
+            job_id=job_id,
+            filename=filename,
+            status=static.STATUS_QUEUED,
+            created_at=now,
+            updated_at=now,
+        )
+        self._prune()
+        self.jobs[job_id] = job
+        self.queue.put_nowait((job, file_path))
+        return job
+
+    def get(self, job_id: str) -> Optional[JobInfo]:
+        return self.jobs.get(job_id)
+
+    def forget(self, job_id: str) -> None:
+        """Drop a finished job, e.g. after its document was deleted"""
+        self.jobs.pop(job_id, None)
+
+    async def reindex(self, record: pdf.Pdf, db: AsyncSession) -> JobInfo:
+        """Queue an indexed document again, only chunks whose text changed are embedded"""
+        if not await chunk.get_ids(record.uuid, db):
+            # chunks with random ids can not be matched, replace them all
+            legacy_ids = await asyncio.to_thread(self.vector_store.legacy_chunk_ids, record.filename)
+            await asyncio.to_thread(self.vector_store.delete_documents, legacy_ids, record.filename)
+
+        await pdf.update_status(record.uuid, static.STATUS_QUEUED, db, chunks_count=0)
+        return self.submit(record.uuid, record.path, record.filename)
+
+    async def delete(self, record: pdf.Pdf, db: AsyncSession) -> int:
+        """Delete a document, its chunks and, unless another document uses it, its PDF file; returns the chunks deleted"""
+        ids = await chunk.get_ids(record.uuid, db)
+        if not ids:
+            # stored before chunk ids were recorded
+            ids = await asyncio.to_thread(self.vector_store.legacy_chunk_ids, record.filename)
+        await asyncio.to_thread(self.vector_store.delete_documents, ids, record.filename)
+        await chunk.delete_by_pdf(record.uuid, db)
+        await pdf.delete(record.uuid, db)
+        self.forget(record.uuid)
+
+        if await pdf.count_by_path(record.path, db) == 0 and os.path.exists(record.path):
+            os.remove(record.path)
+        return len(ids)
+
+    async def sync(self) -> None:
+        """Pick up the documents other workers queued for ingestion or marked for deletion"""
+        # a queued document that was indexed before (chunks_count > 0) is a re-index
+        async with session() as db:
+            for record in await pdf.get_by_status([static.STATUS_QUEUED, static.STATUS_DELETING], db):
+                if record.status == static.STATUS_DELETING:
+                    await self.delete(record, db)
+                elif self._active(record.uuid) is not None:
+                    continue
+                elif record.chunks_count:
+                    await self.reindex(record, db)
+                else:
+                    self.submit(record.uuid, record.path, record.filename)
+
+    def _active(self, job_id: str) -> Optional[JobInfo]:
+        """The job of this queue that is waiting or running for a document, if any"""
+        job = self.jobs.get(job_id)
+        return job if job is not None and job.status in static.STATUSES_IN_PROGRESS else None
+
+    def _prune(self) -> None:
+        finished = [
+            job_id for job_id, job in self.jobs.items()
+            if job.status in (static.STATUS_READY, static.STATUS_FAILED)
+        ]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job, file_path = await self.queue.get()
+            try:
+                await self._process(job, file_path)
+            except Exception as e:
+                logger.error(f"Ingestion of '{job.filename}' failed: {e}")
+                ERRORS.inc(source="ingestion")
+                job.error = str(e)
+                await self._set_status(job, static.STATUS_FAILED)
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, job: JobInfo, file_path: str) -> None:
+        loop = asyncio.get_running_loop()
+        await self._set_status(job, static.STATUS_EXTRACTING)
+        await loop.run_in_executor(self.executor, self._run_pipeline, job, file_path)
+        job.progress = 1.0
+        await self._set_status(job, static.STATUS_READY)
+
+    def _run_pipeline(self, job: JobInfo, file_path: str) -> None:
+        """Embed chunk batches while the producer thread keeps extracting"""
+        # stage timings of both threads are collected into the job
+        with collect_timings() as timings:
+            job.timings = timings
+            self._embed_batches(job, file_path)
+
+    def _embed_batches(self, job: JobInfo, file_path: str) -> None:
+        page_count = max(1, self.pdf_processor.page_count(file_path))
+        # chunks already in the vector store from an earlier run of this document
+        indexed = self._call_db(chunk.get_hashes, job.job_id)
+        seen = set()
+        batches: queue.Queue = queue.Queue(maxsize=PIPELINE_DEPTH)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for batch in self.pdf_processor.iter_batches(file_path, job.filename, doc_id=job.job_id):
+                    if not put(batch):
+                        return
+                put(_DONE)
+            except Exception as e:
+                put(e)
+
+        context = contextvars.copy_context()
+        producer = threading.Thread(target=context.run, args=(produce,), name=f"extract-{job.job_id}", daemon=True)
+        producer.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is _DONE:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+
+                if job.status != static.STATUS_EMBEDDING:
+                    self._update_status(job, static.STATUS_EMBEDDING)
+
+                hashes = [content_hash(document) for document in batch]
+                changed = [
+                    (document, hash_) for document, hash_ in zip(batch, hashes)
+                    if indexed.get(document.id) != hash_
+                ]
+                seen.update(document.id for document in batch)
+                if changed:
+                    self.vector_store.add_documents([document for document, _ in changed])
+                    self._call_db(chunk.upsert, job.job_id, [
+                        (document.id, document.metadata.get("page", 0), hash_) for document, hash_ in changed
+                    ])
+                if len(changed) < len(batch):
+                    CHUNKS.inc(len(batch) - len(changed), outcome="unchanged")
+
+                job.chunks_count += len(batch)
+                job.chunks_unchanged += len(batch) - len(changed)
+                job.progress = min(0.99, batch[-1].metadata.get("page", 0) / page_count)
+                job.updated_at = datetime.now()
+        finally:
+            stop.set()
+            producer.join()
+
+        stale = [id_ for id_ in indexed if id_ not in seen]
+        if stale:
+            self.vector_store.delete_documents(stale, job.filename)
+            self._call_db(chunk.delete_ids, stale)
+            CHUNKS.inc(len(stale), outcome="deleted")
+
+    async def _set_status(self, job: JobInfo, status: str) -> None:
+        job.status = status
+        job.updated_at = datetime.now()
+        async with session() as db:
+            await pdf.update_status(job.job_id, status, db, chunks_count=job.chunks_count)
+
+    def _update_status(self, job: JobInfo, status: str) -> None:
+        """_set_status for the pipeline threads, runs on the event loop"""
+        asyncio.run_coroutine_threadsafe(self._set_status(job, status), self.loop).result()
+
+    def _call_db(self, func, *args):
+        """Call a sqlite.models function with a fresh session from a pipeline thread, runs on the event loop"""
+        async def call():
+            async with session() as db:
+                return await func(*args, db)
+
+        return asyncio.run_coroutine_threadsafe(call(), self.loop).result()
+
+    async def _fail_interrupted(self) -> None:
+        # queued documents and deletions are picked up again by sync()
+        async with session() as db:
+            count = await pdf.replace_status([static.STATUS_EXTRACTING, static.STATUS_EMBEDDING], static.STATUS_FAILED, db)
+
+        if count:
+            logger.warning(f"Marked {count} interrupted ingestion job(s) as failed")
@@ -0,0 +1,97 @@
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import heapq
+import math
+import re
+import threading
+
+# words, and numbers with their thousands/decimal separators ("1,234.5", "2023")
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d+(?:[.,]\d+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word/number tokens, with thousands separators dropped from numbers"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token[0].isdigit():
+            token = re.sub(r",(?=\d{3}\b)", "", token)
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """In-memory inverted index scoring chunks with Okapi BM25.
+
+    Kept next to the vector collection so exact tokens (line-item names,
+    fiscal years, amounts) can be matched even when dense similarity misses
+    them. Updates are incremental; only term frequencies are stored, the
+    chunk text itself stays in the vector store.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        # distinct terms per chunk, so removal only touches that chunk's postings
+        self.doc_terms: Dict[str, Tuple[str, ...]] = {}
+        # filename/page per chunk for filtered searches
+        self.doc_metadata: Dict[str, Dict[str, Any]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str], metadatas: Iterable[Dict[str, Any]]) -> None:
+        with self.lock:
+            for id_, text, metadata in zip(ids, texts, metadatas):
+                if id_ in self.doc_lengths:
+                    self._remove(id_)
+
+                terms = Counter(tokenize(text))
+                for term, frequency in terms.items():
+                    self.postings[term][id_] = frequency
+                length = sum(terms.values())
+                self.doc_terms[id_] = tuple(terms)
+                self.doc_metadata[id_] = {"filename": metadata.get("filename"), "page": metadata.get("page")}
+                self.doc_lengths[id_] = length
+                self.total_length += length
+
+    def remove(self, ids: Iterable[str]) -> None:
+        with self.lock:
+            for id_ in ids:
+                if id_ in self.doc_lengths:
+                    self._remove(id_)
+
+    def search(self, query: str, k: int, where: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Tuple[str, float]]:
+        """Return up to k (chunk id, BM25 score) pairs, best first, optionally only chunks whose metadata passes `where`"""
+        terms = set(tokenize(query))
+        with self.lock:
+            count = len(self.doc_lengths)
+            if not count or not terms:
+                return []
+
+            average_length = self.total_length / count
+            scores: Dict[str, float] = defaultdict(float)
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for id_, frequency in postings.items():
+                    if where is not None and not where(self.doc_metadata[id_]):
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[id_] / average_length)
+                    scores[id_] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def _remove(self, id_: str) -> None:
+        self.doc_metadata.pop(id_, None)
+        for term in self.doc_terms.pop(id_):
+            del self.postings[term][id_]
+            if not self.postings[term]:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(id_)
@@ -0,0 +1,147 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self.lock:
+            self.values[key] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        # per label set: non-cumulative bucket counts (+Inf last), sum, count
+        self.series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Minimal Prometheus text-format registry (no client library dependency)"""
+
+    def __init__(self):
+        self.metrics: List = []
+        self.gauges: List[Tuple[str, str, Callable[[], float]]] = []
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> None:
+        """Gauge whose value is read when /metrics is scraped, replacing an earlier gauge of the same name"""
+        # spawned uvicorn workers run main.py twice, as __mp_main__ and as the imported app
+        self.gauges = [gauge for gauge in self.gauges if gauge[0] != name]
+        self.gauges.append((name, help, read))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for name, help, read in self.gauges:
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {read()}"])
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "rag_stage_duration_seconds",
+    "Duration of ingestion and query pipeline stages",
+    labels=("stage",),
+)
+PAGES = metrics.counter("rag_pages_total", "PDF pages read by ingestion, by whether they were parsed or came from the page cache", labels=("source",))
+CHUNKS = metrics.counter("rag_chunks_total", "Chunks produced by ingestion, by outcome", labels=("outcome",))
+TOKENS = metrics.counter("rag_tokens_total", "Estimated LLM tokens, by kind", labels=("kind",))
+RERANKS = metrics.counter("rag_reranks_total", "Rerank calls, by whether every candidate was scored in budget", labels=("outcome",))
+ERRORS = metrics.counter("rag_errors_total", "Errors, by where they were raised", labels=("source",))
+
+# per-request stage breakdown, set by whoever wants one reported back
+_breakdown: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_breakdown", default=None)
+
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """Collect the stages timed in this context (and contexts copied from it) into a dict"""
+    timings: Dict[str, float] = {}
+    token = _breakdown.set(timings)
+    try:
+        yield timings
+    finally:
+        _breakdown.reset(token)
+
+
+def record(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _breakdown.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
@@ -0,0 +1,444 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from services.vector_backends import ChunkRecord, VectorBackend, VectorCollection
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# below this many live vectors a flat scan is as fast as probing IVF lists
+IVF_MIN_ROWS = 10000
+KMEANS_ITERATIONS = 10
+# rewrite the vector files once this many (and at least half the) rows are dead
+COMPACT_MIN_DEAD = 1024
+
+SQL_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def _where_sql(where: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+    """Translate a Chroma-style where clause into SQL over the chunks' JSON metadata"""
+    if not where:
+        return "1", []
+
+    parts: List[str] = []
+    params: List[Any] = []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            clauses = [_where_sql(part) for part in condition]
+            joiner = " AND " if key == "$and" else " OR "
+            parts.append("(" + joiner.join(sql for sql, _ in clauses) + ")")
+            for _, clause_params in clauses:
+                params.extend(clause_params)
+            continue
+
+        path = f'$."{key}"'
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, operand in condition.items():
+            if operator in ("$in", "$nin"):
+                marks = ",".join("?" * len(operand))
+                parts.append(f"json_extract(metadata, ?) {'IN' if operator == '$in' else 'NOT IN'} ({marks})")
+                params.extend([path, *operand])
+            else:
+                parts.append(f"json_extract(metadata, ?) {SQL_OPERATORS[operator]} ?")
+                params.extend([path, operand])
+    return " AND ".join(parts) or "1", params
+
+
+class MmapCollection(VectorCollection):
+    """Flat (or IVF) vector index in memory-mapped float32 files.
+
+    Row i of vectors.f32 is the embedding in slot i, norms.f32 holds its
+    squared norm and, once trained, lists.i32 its IVF list. Ids, text and
+    metadata live in the backend's SQLite table keyed by slot. Opening only
+    maps the files, pages are read by the OS when a search touches them.
+
+    Compaction renumbers the slots, so it writes a new set of files and bumps
+    the collection's generation in SQLite, which other processes check
+    before they resolve slots.
+    """
+
+    def __init__(self, backend: "MmapBackend", name: str, metadata: Dict[str, Any], dimensions: int, generation: int):
+        self.backend = backend
+        self.name = name
+        self.metadata = metadata
+        self.dimensions = dimensions
+        # of the files mapped, see _file
+        self.generation = generation
+        self.directory = os.path.join(backend.path, name)
+        os.makedirs(self.directory, exist_ok=True)
+        self.centroids_path = os.path.join(self.directory, "centroids.npy")
+
+        # bumped when compaction renumbers slots, so searches can tell their snapshot went stale
+        self.version = 0
+        self._load()
+
+    @property
+    def vectors_path(self) -> str:
+        return self._file("vectors.f32")
+
+    @property
+    def norms_path(self) -> str:
+        return self._file("norms.f32")
+
+    @property
+    def lists_path(self) -> str:
+        return self._file("lists.i32")
+
+    @property
+    def rows(self) -> int:
+        return 0 if self.vectors is None else len(self.vectors)
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        if not ids:
+            return
+
+        # within one batch the last occurrence of an id wins
+        last = {id_: index for index, id_ in enumerate(ids)}
+        keep = sorted(last.values())
+        matrix = np.asarray([embeddings[index] for index in keep], dtype=np.float32)
+
+        with self.backend.lock:
+            if not self.dimensions:
+                self.dimensions = matrix.shape[1]
+                self.backend.execute("UPDATE collections SET dimensions = ? WHERE name = ?", (self.dimensions, self.name))
+            if matrix.shape[1] != self.dimensions:
+                raise ValueError(f"Embedding has {matrix.shape[1]} dimensions, collection '{self.name}' has {self.dimensions}")
+
+            replaced = self._slots([ids[index] for index in keep])
+            start = self.rows
+            with open(self.vectors_path, "ab") as f:
+                f.write(matrix.tobytes())
+            with open(self.norms_path, "ab") as f:
+                f.write(np.einsum("ij,ij->i", matrix, matrix).astype(np.float32).tobytes())
+            if self.centroids is not None:
+                with open(self.lists_path, "ab") as f:
+                    f.write(self._assign(matrix).tobytes())
+
+            self.backend.executemany(
+                "INSERT OR REPLACE INTO chunks (collection, id, slot, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.name, ids[index], start + offset, documents[index], json.dumps(metadatas[index] or {}))
+                    for offset, index in enumerate(keep)
+                ],
+            )
+            self._map()
+            alive = np.ones(self.rows, dtype=bool)
+            alive[:len(self.alive)] = self.alive
+            alive[list(replaced.values())] = False
+            self.alive = alive
+            self._maybe_compact()
+
+    def query(self, embedding, k, where=None) -> List[Tuple[Document, float]]:
+        query = np.asarray(embedding, dtype=np.float32)
+        while True:
+            version, results = self._query(query, k, where)
+            if version == self.version:
+                return results
+
+    def _query(self, query: np.ndarray, k: int, where: Optional[Dict[str, Any]]) -> Tuple[int, List[Tuple[Document, float]]]:
+        with self.backend.lock:
+            self._sync()
+            version = self.version
+            if not self.rows:
+                return version, []
+            self._maybe_train()
+            vectors, norms, lists, centroids, mask = self.vectors, self.norms, self.lists, self.centroids, self.alive.copy()
+            if where:
+                sql, params = _where_sql(where)
+                allowed = np.zeros(len(mask), dtype=bool)
+                # rows another process appended after the files were mapped are not searched yet
+                allowed[[slot for (slot,) in self.backend.execute(
+                    f"SELECT slot FROM chunks WHERE collection = ? AND slot < ? AND {sql}", (self.name, len(mask), *params)
+                )]] = True
+                mask &= allowed
+
+        if centroids is not None and lists is not None:
+            # only scan the lists of the closest centroids
+            probe = np.argsort(((centroids - query) ** 2).sum(axis=1))[:settings.ivf_probe]
+            mask[:len(lists)] &= np.isin(lists, probe)
+
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return version, []
+
+        # squared L2 distance: |x|^2 - 2 x.q + |q|^2
+        if len(rows) == len(vectors):
+            distances = norms - 2 * (vectors @ query) + query @ query
+        else:
+            distances = norms[rows] - 2 * (vectors[rows] @ query) + query @ query
+        k = min(k, len(rows))
+        best = np.argpartition(distances, k - 1)[:k]
+        best = best[np.argsort(distances[best])]
+        slots = [int(rows[index]) for index in best]
+
+        records = self._records(slots)
+        # a compaction in another process renumbered the slots meanwhile, query() tries again
+        self._sync()
+        return version, [
+            (Document(id=records[slot][0], page_content=records[slot][1], metadata=records[slot][2]), float(max(0.0, distances[index])))
+            for slot, index in zip(slots, best)
+            if slot in records
+        ]
+
+    def get(self, ids=None, where=None, limit=None, offset=0, include_content=True) -> List[ChunkRecord]:
+        sql, params = _where_sql(where)
+        if ids is not None:
+            sql += f" AND id IN ({','.join('?' * len(ids))})"
+            params = [*params, *ids]
+        columns = "id, document, metadata" if include_content else "id, NULL, metadata"
+        query = f"SELECT {columns} FROM chunks WHERE collection = ? AND {sql} ORDER BY slot LIMIT ? OFFSET ?"
+        with self.backend.lock:
+            results = self.backend.execute(query, (self.name, *params, -1 if limit is None else limit, offset or 0))
+        return [(id_, document, json.loads(metadata)) for id_, document, metadata in results]
+
+    def get_embeddings(self, ids) -> Dict[str, List[float]]:
+        with self.backend.lock:
+            self._sync()
+            slots = self._slots(ids)
+            while self._sync():
+                slots = self._slots(ids)
+            vectors = self.vectors
+        return {id_: vectors[slot].tolist() for id_, slot in slots.items() if vectors is not None and slot < len(vectors)}
+
+    def count(self, where=None) -> int:
+        sql, params = _where_sql(where)
+        with self.backend.lock:
+            return self.backend.execute(f"SELECT COUNT(*) FROM chunks WHERE collection = ? AND {sql}", (self.name, *params))[0][0]
+
+    def delete(self, ids) -> None:
+        with self.backend.lock:
+            slots = self._slots(ids)
+            if not slots:
+                return
+            self.backend.executemany("DELETE FROM chunks WHERE collection = ? AND id = ?", [(self.name, id_) for id_ in slots])
+            self.alive[list(slots.values())] = False
+            self._maybe_compact()
+
+    def update_metadata(self, ids, metadatas) -> None:
+        with self.backend.lock:
+            self.backend.executemany(
+                "UPDATE chunks SET metadata = ? WHERE collection = ? AND id = ?",
+                [(json.dumps(metadata or {}), self.name, id_) for id_, metadata in zip(ids, metadatas)],
+            )
+
+    def reload(self) -> None:
+        """Read the files and slots again after another process wrote to the collection"""
+        with self.backend.lock:
+            found = self.backend.execute("SELECT dimensions, generation FROM collections WHERE name = ?", (self.name,))
+            if found:
+                self.dimensions, self.generation = found[0]
+            self._load()
+            self.version += 1
+
+    def _sync(self) -> bool:
+        """Reload if another process compacted the collection since the files were mapped, True if it did"""
+        with self.backend.lock:
+            found = self.backend.execute("SELECT generation FROM collections WHERE name = ?", (self.name,))
+            if not found or found[0][0] == self.generation:
+                return False
+            self.reload()
+            return True
+
+    def _file(self, name: str, generation: Optional[int] = None) -> str:
+        """Path of one of the per-slot files of a generation, the first one keeps the plain names"""
+        generation = self.generation if generation is None else generation
+        if not generation:
+            return os.path.join(self.directory, name)
+        stem, extension = os.path.splitext(name)
+        return os.path.join(self.directory, f"{stem}.{generation}{extension}")
+
+    def _load(self) -> None:
+        self.centroids: Optional[np.ndarray] = np.load(self.centroids_path) if os.path.exists(self.centroids_path) else None
+        self._map()
+        slots = [slot for (slot,) in self.backend.execute("SELECT slot FROM chunks WHERE collection = ? AND slot < ?", (self.name, self.rows))]
+        self.alive = np.zeros(self.rows, dtype=bool)
+        self.alive[slots] = True
+        self.trained_rows = len(slots) if self.centroids is not None else 0
+
+    def _map(self) -> None:
+        """(Re)map the files after they grew or were rewritten"""
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        rows = size // (4 * self.dimensions) if self.dimensions else 0
+        if not rows:
+            self.vectors = self.norms = self.lists = None
+            return
+
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+        self.norms = np.memmap(self.norms_path, dtype=np.float32, mode="r", shape=(rows,))
+        self.lists = None
+        if self.centroids is not None and os.path.exists(self.lists_path):
+            self.lists = np.memmap(self.lists_path, dtype=np.int32, mode="r", shape=(rows,))
+
+    def _slots(self, ids: List[str]) -> Dict[str, int]:
+        slots: Dict[str, int] = {}
+        # stay below SQLite's bound parameter limit
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            slots.update(self.backend.execute(
+                f"SELECT id, slot FROM chunks WHERE collection = ? AND id IN ({','.join('?' * len(batch))})", (self.name, *batch)
+            ))
+        return slots
+
+    def _records(self, slots: List[int]) -> Dict[int, ChunkRecord]:
+        with self.backend.lock:
+            results = self.backend.execute(
+                f"SELECT slot, id, document, metadata FROM chunks WHERE collection = ? AND slot IN ({','.join('?' * len(slots))})",
+                (self.name, *slots),
+            )
+        return {slot: (id_, document, json.loads(metadata)) for slot, id_, document, metadata in results}
+
+    def _assign(self, matrix: np.ndarray) -> np.ndarray:
+        """Nearest centroid of every row"""
+        distances = (self.centroids ** 2).sum(axis=1) - 2 * (matrix @ self.centroids.T)
+        return np.argmin(distances, axis=1).astype(np.int32)
+
+    def _maybe_train(self) -> None:
+        """Train IVF centroids once there are enough vectors, and again when the collection doubled"""
+        if settings.mmap_index != "ivf" or self.backend.read_only:
+            # readers load the writer's centroids on refresh
+            return
+        live = int(self.alive.sum())
+        if live < IVF_MIN_ROWS or (self.centroids is not None and live <= 2 * self.trained_rows):
+            return
+
+        lists = settings.ivf_lists or int(np.sqrt(live))
+        rows = np.flatnonzero(self.alive)
+        rng = np.random.default_rng(0)
+        sample = np.asarray(self.vectors[np.sort(rng.choice(rows, size=min(len(rows), 256 * lists), replace=False))])
+        centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmin((centroids ** 2).sum(axis=1) - 2 * (sample @ centroids.T), axis=1)
+            for index in range(lists):
+                members = sample[assignment == index]
+                if len(members):
+                    centroids[index] = members.mean(axis=0)
+
+        self.centroids = centroids
+        assignments = np.empty(self.rows, dtype=np.int32)
+        for start in range(0, self.rows, 65536):
+            assignments[start:start + 65536] = self._assign(np.asarray(self.vectors[start:start + 65536]))
+        # replaced rather than rewritten, a process searching the old files keeps its maps intact
+        assignments.tofile(self.lists_path + ".tmp")
+        os.replace(self.lists_path + ".tmp", self.lists_path)
+        with open(self.centroids_path + ".tmp", "wb") as f:
+            np.save(f, centroids)
+        os.replace(self.centroids_path + ".tmp", self.centroids_path)
+        self.trained_rows = live
+        self._map()
+        logger.info(f"Trained {lists} IVF lists over {live} vectors in '{self.name}'")
+
+    def _maybe_compact(self) -> None:
+        dead = self.rows - int(self.alive.sum())
+        if dead < COMPACT_MIN_DEAD or dead * 2 < self.rows:
+            return
+
+        rows = np.flatnonzero(self.alive)
+        generation = self.generation + 1
+        # other processes keep searching the files they mapped until they see the new generation
+        for name, array in (("vectors.f32", self.vectors), ("norms.f32", self.norms), ("lists.i32", self.lists)):
+            if array is not None:
+                np.asarray(array[rows]).tofile(self._file(name, generation))
+
+        with self.backend.transaction() as connection:
+            connection.executemany(
+                "UPDATE chunks SET slot = ? WHERE collection = ? AND slot = ?",
+                [(new, self.name, int(old)) for new, old in enumerate(rows)],
+            )
+            connection.execute("UPDATE collections SET generation = ? WHERE name = ?", (generation, self.name))
+
+        # the previous generation stays for processes that read it just before the switch
+        if self.generation:
+            for name in ("vectors.f32", "norms.f32", "lists.i32"):
+                if os.path.exists(self._file(name, self.generation - 1)):
+                    os.remove(self._file(name, self.generation - 1))
+        self.generation = generation
+        self.alive = np.ones(len(rows), dtype=bool)
+        self.version += 1
+        self._map()
+        logger.info(f"Compacted '{self.name}': dropped {dead} dead rows")
+
+
+class MmapBackend(VectorBackend):
+    """NumPy vector index on memory-mapped files with chunk metadata in SQLite (VECTOR_DB_TYPE=mmap)"""
+
+    def __init__(self, path: str, read_only: bool = False):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.read_only = read_only
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(os.path.join(path, "metadata.db"), check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS collections ("
+            "name TEXT PRIMARY KEY, metadata TEXT NOT NULL, dimensions INTEGER NOT NULL DEFAULT 0, generation INTEGER NOT NULL DEFAULT 0)"
+        )
+        # stores created before compaction counted generations
+        if "generation" not in [column for _, column, *_ in self.connection.execute("PRAGMA table_info(collections)")]:
+            self.connection.execute("ALTER TABLE collections ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "collection TEXT NOT NULL, id TEXT NOT NULL, slot INTEGER NOT NULL, document TEXT, metadata TEXT NOT NULL, "
+            "PRIMARY KEY (collection, id))"
+        )
+        self.connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_chunks_slot ON chunks (collection, slot)")
+        self.collections: Dict[str, MmapCollection] = {}
+
+    def execute(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def executemany(self, sql: str, rows: List[Tuple]) -> None:
+        with self.transaction() as connection:
+            connection.executemany(sql, rows)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                yield self.connection
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def get_collection(self, name, metadata=None, create=True) -> Optional[MmapCollection]:
+        with self.lock:
+            if name in self.collections:
+                return self.collections[name]
+
+            found = self.execute("SELECT metadata, dimensions, generation FROM collections WHERE name = ?", (name,))
+            if found:
+                stored_metadata, dimensions, generation = json.loads(found[0][0]), found[0][1], found[0][2]
+            elif create:
+                stored_metadata, dimensions, generation = metadata or {}, 0, 0
+                self.execute("INSERT INTO collections (name, metadata) VALUES (?, ?)", (name, json.dumps(stored_metadata)))
+            else:
+                return None
+
+            collection = MmapCollection(self, name, stored_metadata, dimensions, generation)
+            self.collections[name] = collection
+            return collection
+
+    def list_collections(self) -> Dict[str, Dict[str, Any]]:
+        return {name: json.loads(metadata) for name, metadata in self.execute("SELECT name, metadata FROM collections")}
+
+    def refresh(self) -> None:
+        with self.lock:
+            for collection in self.collections.values():
+                collection.reload()
+
+    def vacuum(self) -> None:
+        with self.lock:
+            self.connection.execute("VACUUM")
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
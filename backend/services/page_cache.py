@@ -0,0 +1,68 @@
+from typing import Any, Dict, Optional, Set
+import hashlib
+import json
+import sqlite3
+import threading
+from config import settings
+
+# bytes read at a time when hashing a PDF
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    """Same digest as the upload stores in Pdf.file_hash"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PageCache:
+    """Extracted pages on disk, keyed by (file hash, page, extractor version).
+
+    Chunking is cheap compared to parsing a PDF, so re-indexing a document or
+    re-chunking it with other chunk_size/chunk_overlap settings reads the
+    pages from here. A new extractor version simply misses; the filename is
+    not stored since identical files can be uploaded under different names.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.page_cache_path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "file_hash TEXT NOT NULL, page INTEGER NOT NULL, version TEXT NOT NULL, content TEXT NOT NULL, "
+            "PRIMARY KEY (file_hash, version, page))"
+        )
+        self.connection.commit()
+
+    def pages(self, file_hash: str, version: str) -> Set[int]:
+        """Numbers of the pages cached for this file and extractor version"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT page FROM pages WHERE file_hash = ? AND version = ?", (file_hash, version)
+            ).fetchall()
+        return {page for page, in rows}
+
+    def get(self, file_hash: str, version: str, page: int) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT content FROM pages WHERE file_hash = ? AND version = ? AND page = ?", (file_hash, version, page)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, file_hash: str, version: str, page: int, content: Dict[str, Any]) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages (file_hash, page, version, content) VALUES (?, ?, ?, ?)",
+                (file_hash, page, version, json.dumps(content)),
+            )
+            self.connection.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
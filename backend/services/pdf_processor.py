@@ -1,35 +1,120 @@
+import multiprocessing
 import os
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from uuid import uuid4
-import pdfplumber
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
+import time
+from langchain_core.documents import Document
+from models.schemas import ChunkMetadata
+from services.metrics import PAGES, record, timed
+from services.page_cache import PageCache, file_sha256
 from config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# bump when an extractor's output changes, so cached pages are extracted again
+EXTRACTOR_VERSIONS = {"text": "text-1", "layout": "layout-1"}
+
+
+def _clean_table(rows: List[List[Optional[str]]]) -> Optional[List[List[str]]]:
+    """Normalise cell whitespace and drop empty rows and columns, None if what is left is not a real table"""
+    rows = [[" ".join((cell or "").split()) for cell in row] for row in rows]
+    rows = [row for row in rows if any(row)]
+    if not rows:
+        return None
+
+    columns = [index for index in range(len(rows[0])) if any(row[index] for row in rows)]
+    # framed paragraphs come back as one-column tables, they are text
+    if len(rows) < 2 or len(columns) < 2:
+        return None
+    return [[row[index] for index in columns] for row in rows]
+
+
+def _extract_layout(page) -> Tuple[str, List[List[List[str]]]]:
+    """Tables found by pdfplumber's table finder, and the text outside them"""
+    tables = []
+    for table in page.find_tables():
+        rows = _clean_table(table.extract())
+        if rows is not None:
+            tables.append((table.bbox, rows))
+    if not tables:
+        return page.extract_text() or "", []
+
+    boxes = [bbox for bbox, _ in tables]
+
+    def outside_tables(obj) -> bool:
+        if obj.get("object_type") != "char":
+            return True
+        x = (obj["x0"] + obj["x1"]) / 2
+        y = (obj["top"] + obj["bottom"]) / 2
+        return not any(x0 <= x <= x1 and top <= y <= bottom for x0, top, x1, bottom in boxes)
+
+    return page.filter(outside_tables).extract_text() or "", [rows for _, rows in tables]
+
+
+def _iter_timed_pages(file_path: str, filename: str, pages: Optional[List[int]] = None, mode: str = "text") -> Iterator[Tuple[Dict[str, Any], float]]:
+    """Yield the given 1-based pages (all pages when None) in document order, with extraction seconds"""
+    import pdfplumber
+
+    with pdfplumber.open(file_path, pages=pages) as file:
+        for page in file.pages:
+            start = time.perf_counter()
+            content = {'page': page.page_number, 'filename': filename}
+            if mode == "layout":
+                content['content'], content['tables'] = _extract_layout(page)
+            else:
+                content['content'] = page.extract_text() or ""
+            # drop the parsed layout so memory does not grow with the page count
+            page.flush_cache()
+            yield content, time.perf_counter() - start
+
+
+def chunk_id(doc_id: str, page: int, index: int) -> str:
+    """Stable id of the index-th chunk on a page, so re-indexing a document overwrites its chunks"""
+    return f"{doc_id}:{page}:{index}"
+
+
+def _iter_pages(file_path: str, filename: str, pages: Optional[List[int]] = None, mode: str = "text") -> Iterator[Dict[str, Any]]:
+    for page, seconds in _iter_timed_pages(file_path, filename, pages, mode):
+        record("extract_page", seconds)
+        yield page
+
+
+def _extract_page_range(args: Tuple[str, str, List[int], str]) -> List[Tuple[Dict[str, Any], float]]:
+    """Process pool entry point, extracts the given pages"""
+    # timings travel back with the pages, metrics recorded in the pool process would be lost
+    file_path, filename, pages, mode = args
+    return list(_iter_timed_pages(file_path, filename, pages, mode))
+
 
 class PDFProcessor:
-    def __init__(self):
+    def __init__(self, extract_workers: int = None, extraction_mode: str = None, page_cache_path: str = None):
         # TODO: Initialize text splitter with chunk size and overlap settings
-        self.splitter = RecursiveCharacterTextSplitter(chunk_size=settings.chunk_size, chunk_overlap=settings.chunk_overlap)
+        # - created on first use, like pdfplumber it is only needed once something is ingested
+        self._splitter = None
+        self.extract_workers = settings.pdf_extract_workers if extract_workers is None else extract_workers
+        self._extract_pool: Optional[ProcessPoolExecutor] = None
+        # "text", or "layout" to turn detected tables into row-oriented chunks
+        self.extraction_mode = extraction_mode or settings.pdf_extraction_mode
+        if self.extraction_mode not in EXTRACTOR_VERSIONS:
+            raise ValueError(f"Unsupported pdf_extraction_mode: {self.extraction_mode}")
+        page_cache_path = settings.page_cache_path if page_cache_path is None else page_cache_path
+        self.page_cache: Optional[PageCache] = PageCache(page_cache_path) if page_cache_path else None
     
+    @property
+    def splitter(self):
+        if self._splitter is None:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+            self._splitter = RecursiveCharacterTextSplitter(chunk_size=settings.chunk_size, chunk_overlap=settings.chunk_overlap)
+        return self._splitter
+
     def extract_text_from_pdf(self, file_path: str, filename: str) -> List[Dict[str, Any]]:
         """Extract text from PDF and return page-wise content"""
-        # TODO: Implement PDF text extraction
-        # - Use pdfplumber or PyPDF2 to extract text from each page
+        # - Use pdfplumber to extract text from each page
         # - Return list of dictionaries with page content and metadata
-        result = []
-        with pdfplumber.open(file_path) as file:
-            for page in file.pages:
-                result.append({
-                    'page': page.page_number,
-                    'filename': filename,
-                    'content': page.extract_text() or ""
-                })
-
-        return result
+        return list(self.iter_pages(file_path, filename))
     
     def split_into_chunks(self, pages_content: List[Dict[str, Any]]) -> List[Document]:
         """Split page content into chunks"""
@@ -37,25 +122,182 @@ class PDFProcessor:
         # - Split each page content into smaller chunks
         # - Create Document objects with proper metadata
         # - Return list of Document objects
-        list_document: List[Document] = []
-        
-        for content in pages_content:
-            chunks = self.splitter.split_text(content['content'])
-            for chunk in chunks:
-                document = Document(
-                    id=str(uuid4()),
-                    page_content=chunk,
-                    metadata=content
-                )
-                list_document.append(document)
-        
-        return list_document
-    
-    def process_pdf(self, file_path: str, filename: str) -> List[Document]:
+        return list(self.iter_chunks(pages_content))
+
+    def process_pdf(self, file_path: str, filename: str, doc_id: str = None) -> List[Document]:
         """Process PDF file and return list of Document objects"""
         # TODO: Implement complete PDF processing pipeline
         # 1. Extract text from PDF
         # 2. Split text into chunks
         # 3. Return processed documents
         pages_content = self.extract_text_from_pdf(file_path, filename)
-        return self.split_into_chunks(pages_content)
\ No newline at end of file
+        return list(self.iter_chunks(pages_content, doc_id))
+
+    def iter_pages(self, file_path: str, filename: str) -> Iterator[Dict[str, Any]]:
+        """Yield page-wise content as pages are extracted, or read back from the page cache"""
+        if self.page_cache is None:
+            yield from self._extract_pages(file_path, filename)
+            return
+
+        file_hash = file_sha256(file_path)
+        version = EXTRACTOR_VERSIONS[self.extraction_mode]
+        cached = self.page_cache.pages(file_hash, version)
+        page_count = self.page_count(file_path)
+        missing = [number for number in range(1, page_count + 1) if number not in cached]
+        # an empty page list would make pdfplumber open every page
+        extracted = self._extract_pages(file_path, filename, missing) if missing else None
+
+        try:
+            for number in range(1, page_count + 1):
+                if number in cached:
+                    with timed("page_cache_read"):
+                        content = self.page_cache.get(file_hash, version, number)
+                    PAGES.inc(source="cache")
+                    yield {**content, 'page': number, 'filename': filename}
+                    continue
+
+                content = next(extracted)
+                self.page_cache.put(file_hash, version, number, {key: value for key, value in content.items() if key != 'filename'})
+                yield content
+        finally:
+            if extracted is not None:
+                extracted.close()
+
+    def _extract_pages(self, file_path: str, filename: str, pages: Optional[List[int]] = None) -> Iterator[Dict[str, Any]]:
+        """Parse the given pages (all when None) with pdfplumber, in page order"""
+        # Large files are split into page ranges across a process pool, with
+        # only a few ranges in flight so finished pages never pile up
+        ranges = self._page_ranges(file_path, filename, pages)
+        if len(ranges) <= 1:
+            for page in _iter_pages(file_path, filename, pages, self.extraction_mode):
+                PAGES.inc(source="extracted")
+                yield page
+            return
+
+        pool = self._get_extract_pool()
+        pending = deque()
+        try:
+            for page_range in ranges:
+                pending.append(pool.submit(_extract_page_range, page_range))
+                if len(pending) >= self.extract_workers * 2:
+                    yield from self._recorded(pending.popleft().result())
+
+            while pending:
+                yield from self._recorded(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def iter_chunks(self, pages: Iterable[Dict[str, Any]], doc_id: str = None) -> Iterator[Document]:
+        """Yield chunk Documents page by page, with ids derived from doc_id when given"""
+        # - Tables (layout mode) follow the page text as row-oriented chunks
+        for content in pages:
+            tables = content.get('tables') or []
+            with timed("split"):
+                chunks = self.splitter.split_text(content['content'])
+                table_chunks = [chunk for rows in tables for chunk in self.split_table(rows)]
+                offsets = self.chunk_offsets(content['content'], chunks)
+
+            for index, chunk in enumerate(chunks + table_chunks):
+                metadata = ChunkMetadata(doc_id=doc_id, filename=content['filename'], page=content['page'], chunk_index=index)
+                if index < len(chunks):
+                    metadata.start, metadata.end = offsets[index]
+                else:
+                    metadata.content_type = 'table'
+                yield Document(
+                    id=str(uuid4()) if doc_id is None else chunk_id(doc_id, content['page'], index),
+                    page_content=chunk,
+                    metadata=metadata.model_dump(exclude_none=True)
+                )
+
+    @staticmethod
+    def chunk_offsets(text: str, chunks: List[str], overlap: int = None) -> List[Tuple[Optional[int], Optional[int]]]:
+        """(start, end) character offsets of each chunk in the page text, chunks come in text order"""
+        # - a chunk starts at most `overlap` characters before the previous one ends, searching from
+        #   there keeps repeated text on a page from matching an earlier occurrence
+        # - the splitter strips whitespace, so that bound can be a little off and the search falls back
+        #   to anywhere after the previous start
+        overlap = settings.chunk_overlap if overlap is None else overlap
+        offsets = []
+        previous = None
+        for chunk in chunks:
+            start = -1
+            if previous is not None:
+                start = text.find(chunk, max(0, previous[1] - overlap))
+            if start < 0:
+                start = text.find(chunk, previous[0] + 1 if previous is not None else 0)
+            if start < 0:
+                offsets.append((None, None))
+                continue
+            previous = (start, start + len(chunk))
+            offsets.append(previous)
+        return offsets
+
+    def split_table(self, rows: List[List[str]]) -> List[str]:
+        """Pack table rows into chunks of up to chunk_size characters, each starting with the header row"""
+        # rows are never split and never repeated, a row longer than chunk_size gets a chunk of its own
+        header = " | ".join(rows[0])
+        chunks: List[str] = []
+        lines: List[str] = []
+        size = len(header)
+        for row in rows[1:]:
+            line = " | ".join(row)
+            if lines and size + 1 + len(line) > settings.chunk_size:
+                chunks.append("\n".join([header, *lines]))
+                lines, size = [], len(header)
+            lines.append(line)
+            size += 1 + len(line)
+
+        chunks.append("\n".join([header, *lines]))
+        return chunks
+
+    def iter_batches(self, file_path: str, filename: str, batch_size: int = None, doc_id: str = None) -> Iterator[List[Document]]:
+        """Yield fixed-size lists of chunk Documents ready for embedding"""
+        batch_size = batch_size or settings.ingest_batch_size
+        batch: List[Document] = []
+        for document in self.iter_chunks(self.iter_pages(file_path, filename), doc_id):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    def page_count(self, file_path: str) -> int:
+        import pdfplumber
+
+        with pdfplumber.open(file_path) as file:
+            return len(file.pages)
+
+    def close(self) -> None:
+        if self._extract_pool is not None:
+            self._extract_pool.shutdown(cancel_futures=True)
+            self._extract_pool = None
+        if self.page_cache is not None:
+            self.page_cache.close()
+
+    def _page_ranges(self, file_path: str, filename: str, pages: Optional[List[int]] = None) -> List[Tuple[str, str, List[int], str]]:
+        if self.extract_workers <= 0:
+            return []
+
+        if pages is None:
+            pages = list(range(1, self.page_count(file_path) + 1))
+        per_task = max(1, settings.pdf_extract_pages_per_task)
+        return [
+            (file_path, filename, pages[start:start + per_task], self.extraction_mode)
+            for start in range(0, len(pages), per_task)
+        ]
+
+    def _recorded(self, pages: List[Tuple[Dict[str, Any], float]]) -> Iterator[Dict[str, Any]]:
+        for page, seconds in pages:
+            record("extract_page", seconds)
+            PAGES.inc(source="extracted")
+            yield page
+
+    def _get_extract_pool(self) -> ProcessPoolExecutor:
+        if self._extract_pool is None:
+            # created from an ingestion thread of a process running uvicorn, Chroma and torch
+            # threads; a forked child could inherit a lock one of them held, spawn starts clean
+            self._extract_pool = ProcessPoolExecutor(max_workers=self.extract_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._extract_pool
\ No newline at end of file
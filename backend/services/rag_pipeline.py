@@ -1,9 +1,18 @@
 from collections import defaultdict
-from typing import List, Dict, Any
-from langchain_huggingface import HuggingFaceEndpoint
-from langchain.prompts.prompt import PromptTemplate
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterator, Optional, Tuple
+import asyncio
+import contextvars
+import functools
+import time
+from langchain_core.prompts import PromptTemplate
+from langchain_core.documents import Document
 from services.vector_store import VectorStoreService
-from models.schemas import DocumentSource
+from services.answer_cache import SemanticAnswerCache
+from services.context_builder import ContextBuilder, estimate_tokens
+from services.reranker import CrossEncoderReranker
+from services.metrics import TOKENS, collect_timings, record, timed
+from models.schemas import DocumentSource, RetrievalFilter
 from config import settings
 import logging
 
@@ -11,19 +20,23 @@ logger = logging.getLogger(__name__)
 
 
 class RAGPipeline:
-    def __init__(self, vector_store: VectorStoreService):
+    def __init__(self, vector_store: VectorStoreService, answer_cache: SemanticAnswerCache = None):
         # TODO: Initialize RAG pipeline components
         # - Vector store service
         # - LLM client
         # - Prompt templates
+        # - Answer cache, emptied whenever the vector store changes
+        # - Bounded executor for query embedding and search, and a limit on
+        #   concurrent LLM calls, used by the async entry points
 
         self.vector_store = vector_store
-        self.llm = HuggingFaceEndpoint(
-            repo_id=settings.llm_model,
-            temperature=settings.llm_temperature,
-            max_new_tokens=settings.max_tokens,
-            huggingfacehub_api_token=settings.huggingface_token,
-        )
+        self.answer_cache = answer_cache or SemanticAnswerCache()
+        self.vector_store.add_listener(self.answer_cache.invalidate)
+        self.context_builder = ContextBuilder()
+        self.reranker = CrossEncoderReranker() if settings.rerank else None
+        self.executor = ThreadPoolExecutor(max_workers=settings.retrieval_workers, thread_name_prefix="retrieval")
+        self.llm_semaphore = asyncio.Semaphore(settings.llm_concurrency)
+        self.llm = self._initial_llm()
         
         self.prompt_template = PromptTemplate(
             input_variables=['context', 'question', 'chat_history'],
@@ -45,24 +58,73 @@ class RAGPipeline:
                 [/INST]
                 """.strip()
         )
+        self.summary_template = PromptTemplate(
+            input_variables=['summary', 'turns', 'max_words'],
+            template="""
+                <s>[INST]
+                Update the summary of a conversation between a user and an assistant about
+                financial documents with the new turns below. Keep the companies, figures,
+                periods and open questions that later questions may refer to. Answer with
+                the summary only, in at most {max_words} words.
+
+                Summary so far:
+                {summary}
+
+                New turns:
+                {turns}
+
+                Updated summary:
+                [/INST]
+                """.strip()
+        )
     
-    def generate_answer(self, question: str, chat_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
+    def _initial_llm(self):
+        # both backends import langchain's LLM classes, which are slow to import
+        if settings.llm_backend == "fake":
+            from services.fake_backends import build_fake_llm
+            return build_fake_llm()
+
+        from langchain_huggingface import HuggingFaceEndpoint
+        return HuggingFaceEndpoint(
+            repo_id=settings.llm_model,
+            temperature=settings.llm_temperature,
+            max_new_tokens=settings.max_tokens,
+            huggingfacehub_api_token=settings.huggingface_token,
+        )
+
+    def generate_answer(self, question: str, chat_history: List[Dict[str, str]] = None, filter: RetrievalFilter = None, history_summary: str = None) -> Dict[str, Any]:
         """Generate answer using RAG pipeline"""
         # TODO: Implement RAG pipeline
         # 1. Retrieve relevant documents
         # 2. Generate context from retrieved documents
         # 3. Generate answer using LLM
         # 4. Return answer with sources
+        # Follow-up questions depend on the history, so only standalone ones use the cache.
 
-        documents = self._retrieve_documents(question)
-        context = self._generate_context(documents)
-        response = self._generate_llm_response(question, context, chat_history)
-        try:
+        start = time.perf_counter()
+        use_cache = self.answer_cache.enabled and not chat_history and not history_summary
+        scope = filter.model_dump_json() if filter else ""
+        embedding = None
+        if use_cache:
+            generation = self.answer_cache.generation
+            embedding = self.vector_store.embed_query(question)
+            cached = self.answer_cache.lookup(embedding, started=start, scope=scope)
+            if cached is not None:
+                return cached
 
-            return {
+        documents = self._retrieve_documents(question, embedding, filter)
+        context, context_stats = self._generate_context(documents)
+        response = self._generate_llm_response(question, context, chat_history, history_summary)
+        try:
+            result = {
                 "answer": response,
-                "sources": documents
+                "sources": documents,
+                "context_stats": context_stats
             }
+            if use_cache:
+                self.answer_cache.store(embedding, result, generation, scope=scope)
+
+            return result
         except Exception as e:
             logger.error(e)
             return {
@@ -70,51 +132,338 @@ class RAGPipeline:
                 "sources": []
             }
     
-    def _retrieve_documents(self, query: str) -> List[DocumentSource]:
+    async def agenerate_answer(self, question: str, chat_history: List[Dict[str, str]] = None, filter: RetrievalFilter = None, history_summary: str = None) -> Dict[str, Any]:
+        """Generate answer without blocking the event loop"""
+        start = time.perf_counter()
+        use_cache = self.answer_cache.enabled and not chat_history and not history_summary
+        scope = filter.model_dump_json() if filter else ""
+        generation = self.answer_cache.generation
+        embedding = await self._run(self.vector_store.embed_query, question)
+        if use_cache:
+            cached = self.answer_cache.lookup(embedding, started=start, scope=scope)
+            if cached is not None:
+                return cached
+
+        documents = await self._run(self._retrieve_documents, question, embedding, filter)
+        context, context_stats = self._generate_context(documents)
+        formatted = self._format_prompt(question, context, chat_history, history_summary)
+        async with self.llm_semaphore:
+            with timed("llm"):
+                response = await self.llm.ainvoke(formatted)
+        TOKENS.inc(estimate_tokens(response), kind="completion")
+
+        result = {
+            "answer": response,
+            "sources": documents,
+            "context_stats": context_stats
+        }
+        if use_cache:
+            self.answer_cache.store(embedding, result, generation, scope=scope)
+
+        return result
+
+    async def astream_answer(self, question: str, chat_history: List[Dict[str, str]] = None, filter: RetrievalFilter = None, history_summary: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """Generate answer as a stream of events: sources first, then LLM tokens"""
+        # Closing the generator (e.g. the client went away) closes the LLM
+        # stream with it, so no tokens are generated for nobody.
+        start = time.perf_counter()
+        use_cache = self.answer_cache.enabled and not chat_history and not history_summary
+        scope = filter.model_dump_json() if filter else ""
+        generation = self.answer_cache.generation
+        embedding = await self._run(self.vector_store.embed_query, question)
+        if use_cache:
+            cached = self.answer_cache.lookup(embedding, started=start, scope=scope)
+            if cached is not None:
+                yield {"event": "sources", "data": [document.model_dump(mode="json") for document in cached["sources"]]}
+                yield {"event": "token", "data": cached["answer"]}
+                yield {"event": "done", "data": {"context_stats": cached.get("context_stats")}}
+                return
+
+        documents = await self._run(self._retrieve_documents, question, embedding, filter)
+        yield {"event": "sources", "data": [document.model_dump(mode="json") for document in documents]}
+
+        context, context_stats = self._generate_context(documents)
+        formatted = self._format_prompt(question, context, chat_history, history_summary)
+        tokens: List[str] = []
+        async with self.llm_semaphore:
+            llm_start = time.perf_counter()
+            try:
+                async for token in self.llm.astream(formatted):
+                    if not tokens:
+                        record("llm_first_token", time.perf_counter() - llm_start)
+                    tokens.append(token)
+                    yield {"event": "token", "data": token}
+            finally:
+                record("llm", time.perf_counter() - llm_start)
+        TOKENS.inc(estimate_tokens("".join(tokens)), kind="completion")
+
+        if use_cache:
+            self.answer_cache.store(
+                embedding, {"answer": "".join(tokens), "sources": documents, "context_stats": context_stats}, generation, scope=scope
+            )
+
+        yield {"event": "done", "data": {"context_stats": context_stats}}
+
+    async def abatch_answers(self, questions: List[str], filter: RetrievalFilter = None) -> AsyncIterator[Dict[str, Any]]:
+        """Answer standalone questions together, yielding an event per question as soon as its answer is ready"""
+        # - Repeated questions are answered once
+        # - All questions are embedded in one model call and searched in one vector query
+        # - Questions that retrieve the same chunks share one built context
+        # - LLM calls run concurrently, at most chat_batch_concurrency at a time
+        indexes: Dict[str, List[int]] = defaultdict(list)
+        for index, question in enumerate(questions):
+            indexes[question.strip()].append(index)
+        texts = list(indexes)
+
+        start = time.perf_counter()
+        scope = filter.model_dump_json() if filter else ""
+        generation = self.answer_cache.generation
+        embeddings = await self._run(self.vector_store.embed_queries, texts)
+
+        stats = {"questions": len(questions), "unique_questions": len(texts), "cached": 0, "contexts_built": 0, "errors": 0}
+        pending: List[Tuple[str, List[float]]] = []
+        for text, embedding in zip(texts, embeddings):
+            cached = self.answer_cache.lookup(embedding, started=start, scope=scope) if self.answer_cache.enabled else None
+            if cached is None:
+                pending.append((text, embedding))
+                continue
+            stats["cached"] += 1
+            for event in self._batch_events(indexes[text], text, cached):
+                yield event
+
+        searches = []
+        if pending:
+            searches = await self._run(self.vector_store.similarity_search_many, [embedding for _, embedding in pending], self._search_k(), filter)
+
+        contexts: Dict[Tuple[str, ...], Tuple[str, Dict[str, int]]] = {}
+        semaphore = asyncio.Semaphore(settings.chat_batch_concurrency)
+
+        async def answer(text: str, embedding: List[float], vector_results: List[Tuple[Document, float]]) -> Dict[str, Any]:
+            documents = await self._run(self._retrieve_documents, text, embedding, filter, vector_results)
+            key = tuple(document.content for document in documents)
+            if key not in contexts:
+                contexts[key] = self._generate_context(documents)
+                stats["contexts_built"] += 1
+            context, context_stats = contexts[key]
+
+            formatted = self._format_prompt(text, context)
+            async with semaphore, self.llm_semaphore:
+                with timed("llm"):
+                    response = await self.llm.ainvoke(formatted)
+            TOKENS.inc(estimate_tokens(response), kind="completion")
+
+            result = {"answer": response, "sources": documents, "context_stats": context_stats}
+            if self.answer_cache.enabled:
+                self.answer_cache.store(embedding, result, generation, scope=scope)
+            return result
+
+        tasks = {
+            asyncio.create_task(answer(text, embedding, vector_results)): text
+            for (text, embedding), vector_results in zip(pending, searches)
+        }
+        running = set(tasks)
+        try:
+            while running:
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    text = tasks[task]
+                    if task.exception() is not None:
+                        logger.error(task.exception())
+                        stats["errors"] += 1
+                        for index in indexes[text]:
+                            yield {"event": "error", "data": {"index": index, "question": text, "message": "Sorry, an error occurred while processing your request."}}
+                        continue
+                    for event in self._batch_events(indexes[text], text, task.result()):
+                        yield event
+        finally:
+            # the client went away or the caller stopped early, no more LLM calls
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+        yield {"event": "done", "data": stats}
+
+    def _batch_events(self, indexes: List[int], question: str, result: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        data = {
+            "question": question,
+            "answer": result["answer"],
+            "sources": [document.model_dump(mode="json") for document in result["sources"]],
+            "context_stats": result.get("context_stats"),
+        }
+        for index in indexes:
+            yield {"event": "answer", "data": {"index": index, **data}}
+
+    async def asummarize(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        """Fold chat turns into a running conversation summary of at most chat_summary_max_tokens"""
+        prompt = self.summary_template.format(
+            summary=summary or "(empty)",
+            turns=self._build_history(turns),
+            # ~4 characters per token, ~5 characters per word
+            max_words=settings.chat_summary_max_tokens * 4 // 5,
+        )
+        TOKENS.inc(estimate_tokens(prompt), kind="summary_prompt")
+        async with self.llm_semaphore:
+            with timed("summarize"):
+                response = await self.llm.ainvoke(prompt)
+        TOKENS.inc(estimate_tokens(response), kind="summary_completion")
+
+        # the model may not stick to the length it was asked for, the prompt budget depends on it
+        response = " ".join(response.split())
+        limit = settings.chat_summary_max_tokens * 4
+        if len(response) > limit:
+            response = response[:limit].rsplit(" ", 1)[0]
+        return response
+
+    def warm_up(self) -> Dict[str, float]:
+        """Load the models and run a dummy query through every retrieval step, returns seconds per stage"""
+        # the LLM is remote (or fake) and is not called, a warm-up answer would only cost tokens
+        with collect_timings() as timings:
+            embedding = self.vector_store.embed_query("warm up")
+            self.vector_store.similarity_search_by_vector(embedding, 1)
+            self.vector_store.lexical_search("warm up", 1)
+            if self.reranker is not None:
+                self.reranker.rerank("warm up", [(Document(page_content="warm up"), 0.0)], 1)
+            self._build_prompt("warm up", "", None)
+        return timings
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func: Callable, *args) -> Any:
+        """Run blocking embedding/search work on the bounded retrieval executor"""
+        # copy the context so stage timings recorded in the worker reach this request
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, func, *args))
+
+    def _search_k(self) -> int:
+        """How many vector matches retrieval needs: hybrid fusion and reranking both over-fetch"""
+        k = settings.hybrid_candidates if self.vector_store.lexical_index is not None else settings.retrieval_k
+        candidates = settings.rerank_candidates if self.reranker is not None else settings.retrieval_k
+        return max(k, candidates)
+
+    def _retrieve_documents(self, query: str, embedding: Optional[List[float]] = None, filter: RetrievalFilter = None, vector_results: List[Tuple[Document, float]] = None) -> List[DocumentSource]:
         """Retrieve relevant documents for the query"""
         # TODO: Implement document retrieval
         # - Search vector store for similar documents
         # - Filter by similarity threshold
+        # - Restrict to the requested documents/pages, pushed down into the store
+        # - With hybrid search, fuse with the BM25 ranking; score stays the vector
+        #   distance and the fused RRF score (higher is better) is fused_score.
+        #   Chunks only BM25 found are kept within hybrid_lexical_threshold
+        # - With reranking, over-fetch rerank_candidates and let the cross-encoder
+        #   pick the top-k; score is then the cross-encoder score (higher is better)
+        # - vector_results, when given, are this query's matches from a batched search
         # - Return top-k documents
-        result_search = self.vector_store.similarity_search(query, settings.retrieval_k)
-        documents: List[DocumentSource] = []
-        for doc, score in result_search: 
-            if not doc.page_content.strip():
-                continue
+        hybrid = self.vector_store.lexical_index is not None
+        k = self._search_k()
+        candidates = settings.rerank_candidates if self.reranker is not None else settings.retrieval_k
+        if vector_results is not None:
+            result_search = vector_results
+        elif embedding is not None:
+            result_search = self.vector_store.similarity_search_by_vector(embedding, k, filter)
+        else:
+            result_search = self.vector_store.similarity_search(query, k, filter)
 
-            if score <= settings.similarity_threshold:
-                document_source = DocumentSource(
-                    content=doc.page_content,
-                    page=doc.metadata.get("page", 0),
-                    metadata=doc.metadata,
-                    score=score
-                )
-                documents.append(document_source)
+        result_search = [
+            (doc, score) for doc, score in result_search
+            if doc.page_content.strip() and score <= settings.similarity_threshold
+        ]
+        # vector distance per chunk, the score reported whichever ranking found the chunk
+        distances = {self._key(doc): score for doc, score in result_search}
+        fused_scores: Dict[str, float] = {}
+        if hybrid:
+            lexical_search = [
+                (doc, score) for doc, score in self.vector_store.lexical_search(query, k, filter)
+                if doc.page_content.strip()
+            ]
+            lexical_only = [doc for doc, _ in lexical_search if self._key(doc) not in distances]
+            if lexical_only:
+                if embedding is None:
+                    embedding = self.vector_store.embed_query(query)
+                lexical_distances = self.vector_store.distances(embedding, lexical_only)
+                # a token match alone does not get past the relevance cut-off
+                lexical_search = [
+                    (doc, score) for doc, score in lexical_search
+                    if self._key(doc) in distances or lexical_distances.get(doc.id, float("inf")) <= settings.hybrid_lexical_threshold
+                ]
+                distances.update(lexical_distances)
+            result_search = self._fuse_rankings([result_search, lexical_search], candidates)
+            fused_scores = {self._key(doc): score for doc, score in result_search}
+            result_search = [(doc, distances[self._key(doc)]) for doc, _ in result_search]
+
+        if self.reranker is not None:
+            result_search = self.reranker.rerank(query, result_search[:candidates], settings.rerank_top_k or settings.retrieval_k)
+
+        documents: List[DocumentSource] = []
+        for doc, score in result_search[:settings.retrieval_k]:
+            document_source = DocumentSource(
+                content=doc.page_content,
+                page=doc.metadata.get("page", 0),
+                metadata=doc.metadata,
+                score=score,
+                fused_score=fused_scores.get(self._key(doc)),
+            )
+            documents.append(document_source)
         return documents
 
-    def _generate_context(self, documents: List[DocumentSource]) -> str:
-        """Generate context from retrieved documents"""
-        # TODO: Generate context string from documents
-        return "\n\n".join(f"[Source: Page {document.page}] {document.content}" for document in documents)
+    def _fuse_rankings(self, rankings: List[List[Tuple[Document, float]]], k: int) -> List[Tuple[Document, float]]:
+        """Reciprocal rank fusion: each ranking adds 1 / (rrf_k + rank) per document"""
+        scores: Dict[str, float] = defaultdict(float)
+        documents: Dict[str, Document] = {}
+        for ranking in rankings:
+            for rank, (doc, _) in enumerate(ranking, start=1):
+                key = self._key(doc)
+                documents[key] = doc
+                scores[key] += 1.0 / (settings.rrf_k + rank)
+
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [(documents[key], scores[key]) for key in best]
+
+    @staticmethod
+    def _key(doc: Document) -> str:
+        return doc.id or doc.page_content
+
+    def _generate_context(self, documents: List[DocumentSource]) -> Tuple[str, Dict[str, int]]:
+        """Generate context from retrieved documents, with its token accounting"""
+        # Overlapping neighbours are merged, near-duplicates dropped and the
+        # rest packed in rank order up to settings.context_token_budget
+        with timed("context_build"):
+            context, stats = self.context_builder.build(documents)
+        TOKENS.inc(stats["context_tokens"], kind="context")
+        TOKENS.inc(stats["tokens_saved"], kind="context_saved")
+        return context, stats
     
-    def _generate_llm_response(self, question: str, context: str, chat_history: List[Dict[str, str]] = None) -> str:
+    def _generate_llm_response(self, question: str, context: str, chat_history: List[Dict[str, str]] = None, history_summary: str = None) -> str:
         """Generate response using LLM"""
         # TODO: Implement LLM response generation
         # - Create prompt with question and context
         # - Call LLM API
         # - Return generated response
+        formatted = self._format_prompt(question, context, chat_history, history_summary)
+        with timed("llm"):
+            response = self.llm.invoke(formatted)
+        TOKENS.inc(estimate_tokens(response), kind="completion")
+        return response
 
-        chat_history_str: str = ""
-        if chat_history:
-            for chat in chat_history:
-                chat_history_str += f"User: {chat['user']}\nAssistant: {chat['assistant']}\n"
+    def _format_prompt(self, question: str, context: str, chat_history: List[Dict[str, str]] = None, history_summary: str = None) -> str:
+        with timed("prompt_format"):
+            prompt = self._build_prompt(question, context, chat_history, history_summary)
+        TOKENS.inc(estimate_tokens(prompt), kind="prompt")
+        return prompt
+
+    def _build_prompt(self, question: str, context: str, chat_history: List[Dict[str, str]] = None, history_summary: str = None) -> str:
+        history = self._build_history(chat_history or [])
+        if history_summary:
+            history = f"Summary of the earlier conversation: {history_summary}\n{history}".strip()
 
         inputs = {
-            "chat_history": chat_history_str.strip(),
+            "chat_history": history,
             "context": context,
             "question": question
         }
 
-        formatted = self.prompt_template.format(**inputs)
-        # Gunakan raw_response untuk mendapatkan objek Response
-        return self.llm.invoke(formatted)
\ No newline at end of file
+        return self.prompt_template.format(**inputs)
+
+    def _build_history(self, chat_history: List[Dict[str, str]]) -> str:
+        return "\n".join(f"User: {chat['user']}\nAssistant: {chat['assistant']}" for chat in chat_history)
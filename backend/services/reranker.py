@@ -0,0 +1,74 @@
+from typing import List, Tuple
+import threading
+import time
+from langchain_core.documents import Document
+from services.metrics import RERANKS, record
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def build_cross_encoder():
+    """Load the configured cross-encoder, anything with predict(pairs, batch_size=...) works"""
+    if settings.reranker_backend == "fake":
+        from services.fake_backends import OverlapCrossEncoder
+        return OverlapCrossEncoder()
+
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(settings.reranker_model, device=settings.embedding_device)
+
+
+class CrossEncoderReranker:
+    """Rescore retrieved candidates with a cross-encoder, within a time budget.
+
+    Candidates are scored in batches in their retrieval order. Before each
+    batch after the first, the time of the previous one is used to predict
+    whether the next fits in `time_budget`; if not, the remaining candidates
+    are kept behind the scored ones in retrieval order. The model is loaded on
+    first use and shared by all threads.
+    """
+
+    def __init__(self, batch_size: int = None, time_budget: float = None):
+        self.batch_size = batch_size or settings.rerank_batch_size
+        self.time_budget = settings.rerank_time_budget if time_budget is None else time_budget
+        self.model = None
+        self.lock = threading.Lock()
+
+    def rerank(self, query: str, candidates: List[Tuple[Document, float]], k: int) -> List[Tuple[Document, float]]:
+        """Best k candidates by cross-encoder score (higher is better)"""
+        if not candidates:
+            return []
+
+        model = self._get_model()
+        start = time.perf_counter()
+        scored: List[Tuple[Document, float]] = []
+        last_batch = 0.0
+        for offset in range(0, len(candidates), self.batch_size):
+            elapsed = time.perf_counter() - start
+            if scored and self.time_budget > 0 and elapsed + last_batch > self.time_budget:
+                break
+
+            batch = candidates[offset:offset + self.batch_size]
+            batch_start = time.perf_counter()
+            scores = model.predict([(query, doc.page_content) for doc, _ in batch], batch_size=self.batch_size)
+            last_batch = time.perf_counter() - batch_start
+            scored.extend((doc, float(score)) for (doc, _), score in zip(batch, scores))
+
+        record("rerank", time.perf_counter() - start)
+        remaining = candidates[len(scored):]
+        RERANKS.inc(outcome="budget_exceeded" if remaining else "complete")
+
+        scored.sort(key=lambda item: item[1], reverse=True)
+        if remaining:
+            # unscored candidates rank after every scored one
+            floor = scored[-1][1]
+            scored.extend((doc, floor) for doc, _ in remaining)
+        return scored[:k]
+
+    def _get_model(self):
+        with self.lock:
+            if self.model is None:
+                self.model = build_cross_encoder()
+                logger.info(f"Reranker loaded ({settings.reranker_backend})")
+            return self.model
@@ -0,0 +1,66 @@
+from dataclasses import dataclass
+from uuid import uuid4
+import hashlib
+import os
+import aiofiles
+from fastapi import UploadFile
+from services.api import ApiException
+from services.metrics import timed
+import static
+
+
+@dataclass
+class StagedUpload:
+    """An upload written to a temporary file next to its final path"""
+    path: str
+    size: int
+    sha256: str
+
+    def commit(self, file_path: str) -> None:
+        os.replace(self.path, file_path)
+
+    def discard(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def stored_path(directory: str, sha256: str) -> str:
+    """Where an upload is kept: named by its content, so two different PDFs never share a file.
+    The name it was uploaded under is only kept on the Pdf row."""
+    return f"{directory}/{sha256}.pdf"
+
+
+async def stage_upload(file: UploadFile, directory: str, max_size: int) -> StagedUpload:
+    """Stream `file` to disk in UPLOAD_CHUNK_SIZE pieces, hashing as it goes.
+
+    Memory per upload stays at one chunk. The PDF header is checked on the
+    first chunk and the upload is rejected as soon as it reaches `max_size`,
+    in both cases without reading or writing the rest of the file.
+    """
+    path = os.path.join(directory, f".upload-{uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with timed("upload_stream"):
+            async with aiofiles.open(path, "wb") as f:
+                while True:
+                    chunk = await file.read(static.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if size == 0 and static.PDF_MAGIC not in chunk[:static.PDF_HEADER_WINDOW]:
+                        raise ApiException(400, message="Only PDFs are allowed.")
+
+                    size += len(chunk)
+                    if size >= max_size:
+                        raise ApiException(413, message=f"Maximum limit ({max_size // (1024 * 1024)}MB).")
+                    digest.update(chunk)
+                    await f.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    if size == 0:
+        os.remove(path)
+        raise ApiException(400, message="Empty file.")
+    return StagedUpload(path=path, size=size, sha256=digest.hexdigest())
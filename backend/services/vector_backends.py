@@ -0,0 +1,243 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from services.api import ApiException
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (id, content or None, metadata)
+ChunkRecord = Tuple[str, Optional[str], Dict[str, Any]]
+
+
+class VectorCollection(ABC):
+    """One named set of chunks with their embeddings.
+
+    Filters are Chroma-style where clauses ({"field": value}, $eq/$in/$gte/$lte
+    and $and), distances are squared L2 (lower is closer) in every backend so
+    SIMILARITY_THRESHOLD means the same whichever backend is configured.
+    """
+
+    name: str
+    metadata: Dict[str, Any]
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(self, embedding: List[float], k: int, where: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """The k closest chunks passing `where`, with their distances, closest first"""
+        raise NotImplementedError
+
+    def query_many(self, embeddings: List[List[float]], k: int, where: Optional[Dict[str, Any]] = None) -> List[List[Tuple[Document, float]]]:
+        """query() for several embeddings, backends that can search them in one call override this"""
+        return [self.query(embedding, k, where) for embedding in embeddings]
+
+    @abstractmethod
+    def get(self, ids: List[str] = None, where: Optional[Dict[str, Any]] = None, limit: int = None, offset: int = 0, include_content: bool = True) -> List[ChunkRecord]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_embeddings(self, ids: List[str]) -> Dict[str, List[float]]:
+        """Stored embedding of each of `ids` found in the collection"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self, where: Optional[Dict[str, Any]] = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Replace the metadata of existing chunks, their embeddings and text are kept"""
+        raise NotImplementedError
+
+
+class VectorBackend(ABC):
+    """Storage engine behind VectorStoreService, selected by VECTOR_DB_TYPE"""
+
+    # on in workers that only search a store another one writes, nothing may rewrite its files then
+    read_only: bool = False
+
+    @abstractmethod
+    def get_collection(self, name: str, metadata: Dict[str, Any] = None, create: bool = True) -> Optional[VectorCollection]:
+        """The collection called `name`, None if it does not exist and create is off"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_collections(self) -> Dict[str, Dict[str, Any]]:
+        """Collection name -> collection metadata"""
+        raise NotImplementedError
+
+    def refresh(self) -> None:
+        """Show what another process wrote since the store was opened; collections must be fetched again"""
+        pass
+
+    def vacuum(self) -> None:
+        """Give the space freed by deletes and metadata rewrites back to the filesystem"""
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class ChromaCollection(VectorCollection):
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+        self.metadata = collection.metadata or {}
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(self, embedding, k, where=None) -> List[Tuple[Document, float]]:
+        return self.query_many([embedding], k, where)[0]
+
+    def query_many(self, embeddings, k, where=None) -> List[List[Tuple[Document, float]]]:
+        # one request for all embeddings, the filter is applied once for the batch
+        results = self.collection.query(
+            query_embeddings=embeddings, n_results=k, where=where, include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                (Document(id=id_, page_content=content, metadata=metadata or {}), distance)
+                for id_, content, metadata, distance in zip(ids, documents, metadatas, distances)
+            ]
+            for ids, documents, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"]
+            )
+        ]
+
+    def get(self, ids=None, where=None, limit=None, offset=0, include_content=True) -> List[ChunkRecord]:
+        include = ["metadatas", "documents"] if include_content else ["metadatas"]
+        results = self.collection.get(ids=ids, where=where, limit=limit, offset=offset or None, include=include)
+        documents = results.get("documents") or [None] * len(results["ids"])
+        return list(zip(results["ids"], documents, [metadata or {} for metadata in results["metadatas"]]))
+
+    def get_embeddings(self, ids) -> Dict[str, List[float]]:
+        results = self.collection.get(ids=ids, include=["embeddings"])
+        return {id_: list(embedding) for id_, embedding in zip(results["ids"], results["embeddings"])}
+
+    def count(self, where=None) -> int:
+        if where is None:
+            return self.collection.count()
+        # ids only, no documents or metadata are loaded
+        return len(self.collection.get(where=where, include=[])["ids"])
+
+    def delete(self, ids) -> None:
+        self.collection.delete(ids=ids)
+
+    def update_metadata(self, ids, metadatas) -> None:
+        # Chroma merges metadata on update, keys missing from the new metadata are removed by setting them to None
+        current = self.collection.get(ids=ids, include=["metadatas"])
+        old_keys = {id_: set(metadata or {}) for id_, metadata in zip(current["ids"], current["metadatas"])}
+        self.collection.update(ids=ids, metadatas=[
+            {**{key: None for key in old_keys.get(id_, ()) if key not in metadata}, **metadata}
+            for id_, metadata in zip(ids, metadatas)
+        ])
+
+
+class ChromaBackend(VectorBackend):
+    def __init__(self, path: str):
+        # imported here, chromadb takes about a second to import and mmap deployments never need it
+        import chromadb
+
+        # one client shared by the default collection and the per-document partitions
+        self.path = path
+        self.client = chromadb.PersistentClient(path=path)
+        # the system replaced by the last refresh(), stopped by the next one
+        self.retired_system = None
+
+    def get_collection(self, name, metadata=None, create=True) -> Optional[ChromaCollection]:
+        from chromadb.errors import NotFoundError
+
+        if create:
+            return ChromaCollection(self.client.get_or_create_collection(name=name, metadata=metadata))
+        try:
+            return ChromaCollection(self.client.get_collection(name=name))
+        except NotFoundError:
+            return None
+
+    def list_collections(self) -> Dict[str, Dict[str, Any]]:
+        return {collection.name: collection.metadata or {} for collection in self.client.list_collections()}
+
+    def refresh(self) -> None:
+        import chromadb
+        from chromadb.api.client import SharedSystemClient
+
+        # a client keeps the vector index it loaded, and clients for one path share it within a
+        # process; only a new one reads what another process added. The old client's system is
+        # looked up in the cache, so it is taken before the cache is cleared.
+        system = self.client._system
+        SharedSystemClient.clear_system_cache()
+        self.client = chromadb.PersistentClient(path=self.path)
+        # clearing the cache does not stop a system, each one left running keeps its own index in
+        # memory. The previous one is stopped a refresh late so searches still running on it finish.
+        if self.retired_system is not None:
+            self.retired_system.stop()
+        self.retired_system = system
+
+    def close(self) -> None:
+        if self.retired_system is not None:
+            self.retired_system.stop()
+            self.retired_system = None
+
+
+def matches_where(where: Optional[Dict[str, Any]], metadata: Dict[str, Any]) -> bool:
+    """Evaluate a Chroma-style where clause against one chunk's metadata"""
+    if not where:
+        return True
+
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(part, metadata) for part in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_where(part, metadata) for part in condition):
+                return False
+            continue
+
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, operand in condition.items():
+            if operator == "$eq" and value != operand:
+                return False
+            if operator == "$ne" and value == operand:
+                return False
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$nin" and value in operand:
+                return False
+            if operator in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                if operator == "$gt" and not value > operand:
+                    return False
+                if operator == "$gte" and not value >= operand:
+                    return False
+                if operator == "$lt" and not value < operand:
+                    return False
+                if operator == "$lte" and not value <= operand:
+                    return False
+    return True
+
+
+def build_vector_backend(vector_db_type: str = None, path: str = None, read_only: bool = False) -> VectorBackend:
+    vector_db_type = vector_db_type or settings.vector_db_type
+    path = path or settings.vector_db_path
+
+    if vector_db_type == "chromadb":
+        return ChromaBackend(path)
+    if vector_db_type == "mmap":
+        from services.mmap_index import MmapBackend
+        return MmapBackend(path, read_only=read_only)
+
+    logger.error(f"Vector DB type '{vector_db_type}' is not supported.")
+    raise ApiException(code=500, message=f"Unsupported vector_db_type: {vector_db_type}")
@@ -1,87 +1,379 @@
-from typing import List, Tuple
-from langchain.schema import Document
-from langchain_chroma import Chroma
-from langchain_community.vectorstores import VectorStore
-from langchain_huggingface import HuggingFaceEmbeddings
-from services.api import ApiException
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from collections import defaultdict
+import hashlib
+import threading
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from services.embeddings import EmbeddingWorker, LazyEmbeddings, WorkerEmbeddings, build_local_embeddings
+from services.lexical_index import BM25Index
+from services.vector_backends import VectorBackend, VectorCollection, build_vector_backend, matches_where
+from services.metrics import CHUNKS, timed
 from config import settings
-from models.schemas import ChunkInfo
+from models.schemas import ChunkInfo, RetrievalFilter
 from uuid import uuid4
 import logging
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_COLLECTION = "vector_collection"
+# per-document collections in vector_partition_mode "document"
+PARTITION_PREFIX = "doc_"
+
 class VectorStoreService:
-    def __init__(self):
+    def __init__(self, read_only: bool = False):
         # TODO: Initialize vector store (ChromaDB, FAISS, etc.)
+        # - VECTOR_DB_TYPE picks the backend: "chromadb", or "mmap" for the
+        #   NumPy index on memory-mapped files in services/mmap_index.py
+        # - read_only: another worker writes the store (see services/workers.py),
+        #   this one searches it and calls refresh() when it changed
 
+        self.read_only = read_only
+        self.embedding_worker: Optional[EmbeddingWorker] = None
+        self.embeddings = self._initial_embeddings()
+        # "single" keeps every chunk in one collection, "document" gives each
+        # file its own collection so filtered queries only touch those files
+        self.partition_mode = settings.vector_partition_mode
+        self.partitions: Dict[str, VectorCollection] = {}
+        self.partitions_lock = threading.Lock()
+        self.backend: VectorBackend = build_vector_backend(read_only=read_only)
         self.vector_store = self._initial_vector_store()
+        # lexical index over the same chunks for hybrid retrieval
+        self.lexical_index: Optional[BM25Index] = self._initial_lexical_index() if settings.hybrid_search else None
+        # called after every add/delete, e.g. to drop cached answers
+        self.listeners: List[Callable[[], None]] = []
+        # called with the (added, removed) chunk ids of every add/delete
+        self.change_listeners: List[Callable[[List[str], List[str]], None]] = []
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        self.listeners.append(listener)
+
+    def add_change_listener(self, listener: Callable[[List[str], List[str]], None]) -> None:
+        self.change_listeners.append(listener)
     
+    def close(self) -> None:
+        if self.embedding_worker is not None:
+            self.embedding_worker.stop()
+        self.backend.close()
+
     def add_documents(self, documents: List[Document]) -> None:
         """Add documents to the vector store"""
         # TODO: Implement document addition to vector store
-        # - Generate embeddings for documents
+        # - Generate embeddings for documents, chunks whose text was embedded
+        #   before are served from the embedding cache
         # - Store documents with embeddings in vector database
 
-        self.vector_store.add_documents(documents=documents)
+        by_collection: Dict[str, List[Document]] = defaultdict(list)
+        for document in documents:
+            by_collection[document.metadata.get("filename", "")].append(document)
+
+        added: List[str] = []
+        for filename, group in by_collection.items():
+            ids = [document.id or str(uuid4()) for document in group]
+            added.extend(ids)
+            texts = [document.page_content for document in group]
+            # embed and insert separately so each is measured on its own
+            with timed("embed_batch"):
+                vectors = self.embeddings.embed_documents(texts)
+            with timed("vector_insert"):
+                self._collection_for(filename).upsert(
+                    ids=ids, embeddings=vectors, documents=texts, metadatas=[document.metadata for document in group]
+                )
+            CHUNKS.inc(len(group), outcome="indexed")
+            if self.lexical_index is not None:
+                self.lexical_index.add(ids, [document.page_content for document in group], [document.metadata for document in group])
+        self._notify(added=added)
     
-    def similarity_search(self, query: str, k: int = None) -> List[Tuple[Document, float]]:
+    def similarity_search(self, query: str, k: int = None, filter: RetrievalFilter = None) -> List[Tuple[Document, float]]:
         """Search for similar documents"""
         # TODO: Implement similarity search
         # - Generate embedding for query
         # - Search for similar documents in vector store
         # - Return documents with similarity scores
 
-        result = self.vector_store.similarity_search_with_score(query, k=k or settings.retrieval_k)
-        return result
+        return self.similarity_search_by_vector(self.embed_query(query), k, filter)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = None, filter: RetrievalFilter = None) -> List[Tuple[Document, float]]:
+        """Search with an already computed query embedding, the filter is pushed down as a where clause"""
+        k = k or settings.retrieval_k
+        where = self.build_where(filter)
+        result = []
+        with timed("vector_search"):
+            for collection in self._collections(filter.filenames if filter else None):
+                result.extend(collection.query(embedding, k, where))
+
+        # distances from different partitions are comparable, keep the k closest overall
+        result.sort(key=lambda item: item[1])
+        return result[:k]
+
+    def similarity_search_many(self, embeddings: List[List[float]], k: int = None, filter: RetrievalFilter = None) -> List[List[Tuple[Document, float]]]:
+        """similarity_search_by_vector for a batch of query embeddings, one backend query per collection"""
+        k = k or settings.retrieval_k
+        where = self.build_where(filter)
+        results: List[List[Tuple[Document, float]]] = [[] for _ in embeddings]
+        with timed("vector_search"):
+            for collection in self._collections(filter.filenames if filter else None):
+                for result, matches in zip(results, collection.query_many(embeddings, k, where)):
+                    result.extend(matches)
+
+        for result in results:
+            result.sort(key=lambda item: item[1])
+        return [result[:k] for result in results]
+
+    def lexical_search(self, query: str, k: int = None, filter: RetrievalFilter = None) -> List[Tuple[Document, float]]:
+        """Search the BM25 index, returns documents with BM25 scores (higher is better)"""
+        if self.lexical_index is None:
+            return []
+
+        matches = None if filter is None else (lambda metadata: self._matches(filter, metadata))
+        with timed("lexical_search"):
+            hits = self.lexical_index.search(query, k or settings.retrieval_k, where=matches)
+        if not hits:
+            return []
+
+        ids = [id_ for id_, _ in hits]
+        documents = {}
+        for collection in self._collections(filter.filenames if filter else None):
+            for id_, content, metadata in collection.get(ids=ids):
+                documents[id_] = Document(id=id_, page_content=content, metadata=metadata)
+        return [(documents[id_], score) for id_, score in hits if id_ in documents]
+
+    def distances(self, embedding: List[float], documents: List[Document]) -> Dict[str, float]:
+        """Squared L2 distance from `embedding` to each stored document, as similarity_search reports it"""
+        by_filename: Dict[str, List[str]] = defaultdict(list)
+        for document in documents:
+            by_filename[document.metadata.get("filename", "")].append(document.id)
+
+        distances: Dict[str, float] = {}
+        for filename, ids in by_filename.items():
+            for collection in self._collections([filename]):
+                for id_, vector in collection.get_embeddings(ids).items():
+                    distances[id_] = float(sum((a - b) ** 2 for a, b in zip(vector, embedding)))
+        return distances
+
+    def build_where(self, filter: RetrievalFilter = None) -> Optional[Dict[str, Any]]:
+        """Translate a RetrievalFilter into a where clause (Chroma syntax, understood by every backend)"""
+        if filter is None:
+            return None
+
+        conditions = []
+        if filter.filenames:
+            conditions.append({"filename": {"$in": filter.filenames}})
+        if filter.page_from is not None:
+            conditions.append({"page": {"$gte": filter.page_from}})
+        if filter.page_to is not None:
+            conditions.append({"page": {"$lte": filter.page_to}})
+
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+
+    def embed_query(self, query: str) -> List[float]:
+        with timed("query_embedding"):
+            return self.embeddings.embed_query(query)
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed many queries in one batched model call"""
+        # the sentence-transformers models embed queries and documents alike; bypass the
+        # embedding cache so questions are not stored as chunk embeddings
+        embeddings = getattr(self.embeddings, "underlying_embeddings", self.embeddings)
+        with timed("query_embedding"):
+            return embeddings.embed_documents(queries)
     
-    def delete_documents(self, document_ids: List[str]) -> None:
-        """Delete documents from vector store"""
+    def delete_documents(self, document_ids: List[str], filename: str = None) -> None:
+        """Delete documents from vector store, only looking in the collection of `filename` when given"""
         # TODO: Implement document deletion
-        
-        self.vector_store.delete(ids=document_ids)
+
+        if not document_ids:
+            return
+        for collection in self._collections([filename] if filename is not None else None):
+            collection.delete(ids=document_ids)
+        if self.lexical_index is not None:
+            self.lexical_index.remove(document_ids)
+        self._notify(removed=document_ids)
     
+    def legacy_chunk_ids(self, filename: str) -> List[str]:
+        """Ids of the chunks of `filename` stored with random ids, before chunks were keyed by document"""
+        return [
+            chunk.id for chunk in self.iter_chunks(filename=filename, include_content=False)
+            if "doc_id" not in chunk.metadata
+        ]
+
     def get_all_document(self) -> List[ChunkInfo]:
-        return self._get_all_document()
+        return list(self.iter_chunks())
+
+    def get_chunks(self, offset: int = 0, limit: int = 100, filename: str = None, page: int = None, include_content: bool = True) -> Tuple[List[ChunkInfo], int]:
+        """Get one page of chunks matching the filters, and the total number of matches"""
+        where = self._chunk_filter(filename, page)
+        collections = self._collections([filename] if filename is not None else None)
+        chunks = self._get_chunks(collections, offset, limit, where, include_content)
+        total_count = self._count_chunks(collections, where)
+        return chunks, total_count
+
+    def iter_chunks(self, filename: str = None, page: int = None, include_content: bool = True, batch_size: int = 500) -> Iterator[ChunkInfo]:
+        """Yield all chunks matching the filters, reading the store batch by batch"""
+        where = self._chunk_filter(filename, page)
+        for collection in self._collections([filename] if filename is not None else None):
+            offset = 0
+            while True:
+                chunks = self._get_chunks([collection], offset, batch_size, where, include_content)
+                yield from chunks
+                if len(chunks) < batch_size:
+                    break
+                offset += batch_size
+
+    def refresh(self, added: List[str] = None, removed: List[str] = None) -> None:
+        """Reopen the store to see the chunks another worker wrote. The lexical index is updated with
+        the chunk ids another worker added and removed, or rebuilt when they are not known."""
+        self.backend.refresh()
+        with self.partitions_lock:
+            self.partitions = {}
+        self.vector_store = self._initial_vector_store()
+        if self.lexical_index is not None:
+            if added is None and removed is None:
+                # built aside, searches keep using the old index meanwhile
+                self.lexical_index = self._initial_lexical_index()
+            else:
+                self._update_lexical_index(added or [], removed or [])
+        self._notify()
+
+    def promote(self) -> None:
+        """Become the writer after the previous one exited"""
+        self.refresh()
+        self.read_only = self.backend.read_only = False
+        if self.embedding_worker is not None and self.embedding_worker.process is None:
+            self.embedding_worker.start()
 
     def get_document_count(self) -> int:
         """Get total number of documents in vector store"""
         # TODO: Return document count
 
-        if hasattr(self.vector_store, "collection") and hasattr(self.vector_store.collection, "count"):  # Chroma
-            return self.vector_store.collection.count()
-    
-        logger.error("Document count not supported for this vector store.")
-        raise ApiException("Document count not supported for this vector store.", code=500)
-
-    def _initial_vector_store(self) -> Chroma:
-        vector_db_type = settings.vector_db_type
-        persist_directory = settings.vector_db_path
-        embeddings = HuggingFaceEmbeddings(model_name=settings.embedding_model)
-
-        if vector_db_type == "chromadb":
-            return Chroma(
-                collection_name="vector_collection",
-                embedding_function=embeddings,
-                persist_directory=persist_directory,
-            )
-        
-        logger.error(f"Vector DB type '{vector_db_type}' is not supported.")
-        raise ApiException(f"Unsupported vector_db_type: {vector_db_type}", code=500)
+        return sum(collection.count() for collection in self._collections())
+
+    def _initial_embeddings(self) -> Embeddings:
+        if settings.embedding_worker:
+            self.embedding_worker = EmbeddingWorker()
+            # readers use the writer's shared worker, if there is one
+            if not (self.read_only and self.embedding_worker.shared):
+                self.embedding_worker.start()
+            embeddings = WorkerEmbeddings(self.embedding_worker)
+        else:
+            # the model is loaded by warm_up() or the first embedding, not here
+            embeddings = LazyEmbeddings(build_local_embeddings)
+
+        if not settings.embedding_cache_path:
+            return embeddings
+
+        from langchain.embeddings import CacheBackedEmbeddings
+        from langchain_community.storage import SQLStore
+
+        # keyed by a hash of the chunk text, namespaced by model so switching models never mixes vectors
+        namespace = settings.embedding_model
+        if settings.embedding_backend == "fake":
+            namespace = f"fake-{settings.fake_embedding_dimensions}"
+        store = SQLStore(namespace=namespace, db_url=f"sqlite:///{settings.embedding_cache_path}")
+        store.create_schema()
+        return CacheBackedEmbeddings.from_bytes_store(embeddings, store, namespace=namespace)
+
+    def _initial_vector_store(self) -> VectorCollection:
+        return self.backend.get_collection(DEFAULT_COLLECTION)
+
+    def _collection_for(self, filename: str, create: bool = True) -> Optional[VectorCollection]:
+        """Collection that stores the chunks of `filename`, None if it does not exist and create is off"""
+        if self.partition_mode != "document":
+            return self.vector_store
+
+        name = PARTITION_PREFIX + hashlib.sha1(filename.encode("utf-8")).hexdigest()[:24]
+        with self.partitions_lock:
+            if name not in self.partitions:
+                collection = self.backend.get_collection(name, metadata={"filename": filename}, create=create)
+                if collection is None:
+                    return None
+                self.partitions[name] = collection
+            return self.partitions[name]
+
+    def _collections(self, filenames: Optional[List[str]] = None) -> List[VectorCollection]:
+        """Collections to read for the given files (all files when None)"""
+        if self.partition_mode != "document":
+            return [self.vector_store]
+
+        if filenames is None:
+            filenames = [
+                metadata.get("filename", "")
+                for name, metadata in self.backend.list_collections().items()
+                if name.startswith(PARTITION_PREFIX)
+            ]
+
+        collections = [self._collection_for(filename, create=False) for filename in filenames]
+        return [collection for collection in collections if collection is not None]
     
-    def _get_all_document(self) -> List[ChunkInfo]:
-        vector_db_type = settings.vector_db_type
-        if vector_db_type == "chromadb":
-            results = self.vector_store.get()
-            return [
+    def _initial_lexical_index(self) -> BM25Index:
+        index = BM25Index()
+        for chunk in self.iter_chunks():
+            index.add([chunk.id], [chunk.content or ""], [chunk.metadata])
+        logger.info(f"Lexical index built over {len(index)} chunks")
+        return index
+
+    def _update_lexical_index(self, added: List[str], removed: List[str], batch_size: int = 500) -> None:
+        self.lexical_index.remove(removed)
+        collections = self._collections()
+        for start in range(0, len(added), batch_size):
+            ids = added[start:start + batch_size]
+            for collection in collections:
+                records = collection.get(ids=ids)
+                self.lexical_index.add(
+                    [id_ for id_, _, _ in records], [content or "" for _, content, _ in records], [metadata for _, _, metadata in records]
+                )
+
+    def _notify(self, added: List[str] = None, removed: List[str] = None) -> None:
+        for listener in self.listeners:
+            listener()
+        if added or removed:
+            for listener in self.change_listeners:
+                listener(added or [], removed or [])
+
+    def _matches(self, filter: RetrievalFilter, metadata: Dict[str, Any]) -> bool:
+        """Python equivalent of build_where for the lexical index"""
+        return matches_where(self.build_where(filter), metadata)
+
+    def _chunk_filter(self, filename: str = None, page: int = None) -> Optional[Dict[str, Any]]:
+        conditions = []
+        if filename is not None:
+            conditions.append({"filename": filename})
+        if page is not None:
+            conditions.append({"page": page})
+
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+
+    def _count_chunks(self, collections: List[VectorCollection], where: Optional[Dict[str, Any]]) -> int:
+        return sum(collection.count(where) for collection in collections)
+
+    def _get_chunks(self, collections: List[VectorCollection], offset: int, limit: int, where: Optional[Dict[str, Any]], include_content: bool) -> List[ChunkInfo]:
+        chunks: List[ChunkInfo] = []
+        # offset runs across the collections in order
+        for collection in collections:
+            if len(chunks) >= limit:
+                break
+            if len(collections) > 1:
+                count = collection.count(where)
+                if offset >= count:
+                    offset -= count
+                    continue
+
+            records = collection.get(where=where, limit=limit - len(chunks), offset=offset, include_content=include_content)
+            offset = 0
+            chunks.extend(
                 ChunkInfo(
                     content=doc,
                     id=id_,
                     metadata=metadata,
                     page=metadata.get("page", 0)
                 )
-                for id_, doc, metadata in zip(results['ids'], results['documents'], results['metadatas'])
-            ]
-        
-        logger.error(f"Vector DB type '{vector_db_type}' is not supported.")
-        raise ApiException(code=500, message=f"Unsupported vector_db_type: {vector_db_type}")
\ No newline at end of file
+                for id_, doc, metadata in records
+            )
+        return chunks
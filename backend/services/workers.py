@@ -0,0 +1,211 @@
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterable, Iterator, List, Optional, Set, Tuple
+import asyncio
+import json
+import os
+import threading
+from services.metrics import ERRORS
+from config import settings
+import logging
+
+try:
+    import fcntl
+except ImportError:
+    # no advisory file locks (Windows): every process acts as the writer, run a single worker there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# the journal starts over past this size, readers further behind reload everything
+JOURNAL_MAX_BYTES = 8 * 1024 * 1024
+
+# (chunk ids added or replaced, chunk ids removed), None when a reader must reload everything
+Changes = Optional[Tuple[List[str], List[str]]]
+
+
+class WorkerCoordinator:
+    """Share one document database and vector store between uvicorn workers.
+
+    Exactly one worker, the writer, holds an exclusive lock on WRITER_LOCK_PATH.
+    It runs ingestion and every vector store write. The chunk ids it changes
+    are collected and, once per WORKER_SYNC_INTERVAL, appended to a journal
+    next to STORE_GENERATION_PATH under the next generation number, so a long
+    ingest bumps the generation once a poll rather than once a batch. The
+    other workers only read: they queue uploads, re-indexes and deletes as Pdf
+    rows for the writer to pick up, and when the generation changes they
+    reload their view of the vector store and apply the journaled ids to
+    their lexical index. A reader takes over the lock, and the writer's work,
+    when the writer exits.
+
+    With a single worker the lock is simply taken at startup.
+    """
+
+    def __init__(self, lock_path: str = None, generation_path: str = None, interval: float = None):
+        self.lock_path = lock_path or settings.writer_lock_path
+        self.generation_path = generation_path or settings.store_generation_path
+        self.journal_path = self.generation_path + ".journal"
+        self.interval = settings.worker_sync_interval if interval is None else interval
+        self.lock_file = None
+        self.generation = self.read_generation()
+        self.task: Optional[asyncio.Task] = None
+        # changes recorded by the writer since the last bump; recorded from ingestion threads
+        self.pending_lock = threading.Lock()
+        self.pending_added: Set[str] = set()
+        self.pending_removed: Set[str] = set()
+
+    @property
+    def is_writer(self) -> bool:
+        return self.lock_file is not None
+
+    @contextmanager
+    def startup(self) -> Iterator[None]:
+        """Let workers run their startup (schema migration, collection creation) one at a time"""
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.lock_path + ".startup", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def try_acquire(self) -> bool:
+        """Become the writer if no other worker is, True when this worker is the writer"""
+        if self.lock_file is not None:
+            return True
+        if fcntl is None:
+            self.lock_file = open(self.lock_path, "a")
+            return True
+
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        self.lock_file = lock_file
+        logger.info(f"Worker {os.getpid()} is the writer")
+        return True
+
+    def read_generation(self) -> int:
+        try:
+            with open(self.generation_path) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def record(self, added: Iterable[str], removed: Iterable[str]) -> None:
+        """Note chunks the writer changed, the readers hear of them at the next bump()"""
+        with self.pending_lock:
+            for id_ in removed:
+                self.pending_added.discard(id_)
+                self.pending_removed.add(id_)
+            # removals are applied first, so an id removed and added again ends up added
+            self.pending_added.update(added)
+
+    def bump(self) -> None:
+        """Journal the recorded changes under a new generation, if there are any"""
+        with self.pending_lock:
+            if not self.pending_added and not self.pending_removed:
+                return
+            added, removed = sorted(self.pending_added), sorted(self.pending_removed)
+            self.pending_added, self.pending_removed = set(), set()
+
+        self.generation += 1
+        entry = json.dumps({"generation": self.generation, "added": added, "removed": removed}) + "\n"
+        try:
+            journal_size = os.path.getsize(self.journal_path)
+        except OSError:
+            journal_size = 0
+        if journal_size > JOURNAL_MAX_BYTES:
+            self._replace(self.journal_path, entry)
+        else:
+            # one write per entry; readers never read past the generation, which is written after
+            with open(self.journal_path, "a") as f:
+                f.write(entry)
+        self._replace(self.generation_path, str(self.generation))
+
+    def read_changes(self, since: int, until: int) -> Changes:
+        """Ids changed by generations since+1 to until, None when the journal does not cover them all"""
+        if until <= since:
+            return None
+
+        added: Set[str] = set()
+        removed: Set[str] = set()
+        expected = since + 1
+        try:
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # an entry being appended, past `until`
+                        break
+                    if entry["generation"] <= since:
+                        continue
+                    if entry["generation"] != expected:
+                        return None
+                    for id_ in entry["removed"]:
+                        added.discard(id_)
+                        removed.add(id_)
+                    added.update(entry["added"])
+                    if expected == until:
+                        return sorted(added), sorted(removed)
+                    expected += 1
+        except OSError:
+            pass
+        return None
+
+    def start(self, promote: Callable[[], Awaitable[None]], sync: Callable[[], Awaitable[None]], refresh: Callable[[Changes], Awaitable[None]]) -> None:
+        """Poll in the background: `promote` once this worker becomes the writer, then `sync` and
+        bump every interval; while reading, `refresh` with the changes whenever the writer made some"""
+        self.task = asyncio.create_task(self._run(promote, sync, refresh))
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.lock_file is not None:
+            # readers still hear of the last writes
+            self.bump()
+            # closing the file releases the lock for the next writer
+            self.lock_file.close()
+            self.lock_file = None
+
+    async def _run(self, promote, sync, refresh) -> None:
+        # a worker that took the lock at startup was promoted there
+        promoted = self.is_writer
+        while True:
+            try:
+                if self.try_acquire():
+                    if not promoted:
+                        # the store may have changed since this worker last refreshed
+                        self.generation = max(self.generation, self.read_generation())
+                        await promote()
+                        promoted = True
+                    await sync()
+                    self.bump()
+                else:
+                    generation = self.read_generation()
+                    if generation != self.generation:
+                        changes = self.read_changes(self.generation, generation)
+                        self.generation = generation
+                        await refresh(changes)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Worker sync failed: {e}")
+                ERRORS.inc(source="worker_sync")
+            await asyncio.sleep(self.interval)
+
+    @staticmethod
+    def _replace(path: str, content: str) -> None:
+        # written aside and renamed, so a reader never sees a half-written file
+        temporary = f"{path}.{os.getpid()}"
+        with open(temporary, "w") as f:
+            f.write(content)
+        os.replace(temporary, path)
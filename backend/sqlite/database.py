@@ -1,14 +1,48 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from typing import AsyncIterator
+from sqlalchemy import event, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from config import settings
 
-engine = create_engine('sqlite:///./mydatabase.db', echo=True)
+engine = create_async_engine(
+    settings.database_url,
+    echo=settings.database_echo,
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
+    pool_pre_ping=True,
+)
 Base = declarative_base()
 
-session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+session = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
-def db():
-    db = session()
-    try:
+@event.listens_for(engine.sync_engine, "connect")
+def _configure_sqlite(connection, _):
+    # WAL lets readers run while a job is writing; wait for the writer instead of failing
+    cursor = connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.database_busy_timeout}")
+    cursor.close()
+
+async def db() -> AsyncIterator[AsyncSession]:
+    async with session() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+def _migrate(connection):
+    Base.metadata.create_all(bind=connection)
+
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+async def migrate():
+    """Create missing tables, then add columns and indexes introduced after a table was created"""
+    async with engine.begin() as connection:
+        await connection.run_sync(_migrate)
@@ -0,0 +1,107 @@
+from sqlite.database import Base
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import Float, String, Integer, Text, delete as delete_rows, func, or_, select, update
+from typing import List, Optional, Tuple
+
+class ChatSession(Base):
+    """A server-side conversation, shared by every worker: the summary of its folded turns"""
+    __tablename__ = 'chat_sessions'
+    session_id: Mapped[str] = mapped_column(String, primary_key=True)
+    summary: Mapped[str] = mapped_column(Text, default="")
+    turn_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[str] = mapped_column(String)
+    # time.time() of the last use, for expiry and eviction
+    last_used: Mapped[float] = mapped_column(Float, index=True)
+    # time.time() until which one worker is summarizing the session, None when nobody is
+    summarizing_until: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+class ChatTurn(Base):
+    """A turn of a chat session not folded into its summary yet"""
+    __tablename__ = 'chat_turns'
+    # increasing, so turns read back in the order they were added
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    session_id: Mapped[str] = mapped_column(String, index=True)
+    user: Mapped[str] = mapped_column(Text)
+    assistant: Mapped[str] = mapped_column(Text)
+
+async def create(session_id: str, created_at: str, last_used: float, db: AsyncSession) -> ChatSession:
+    chat_session = ChatSession(session_id=session_id, summary="", turn_count=0, created_at=created_at, last_used=last_used)
+    db.add(chat_session)
+    await db.commit()
+    return chat_session
+
+async def get(session_id: str, db: AsyncSession) -> Optional[ChatSession]:
+    return await db.get(ChatSession, session_id)
+
+async def get_turns(session_id: str, db: AsyncSession) -> List[ChatTurn]:
+    return list((await db.scalars(select(ChatTurn).where(ChatTurn.session_id == session_id).order_by(ChatTurn.id))).all())
+
+async def touch(session_id: str, last_used: float, db: AsyncSession) -> None:
+    await db.execute(update(ChatSession).where(ChatSession.session_id == session_id).values(last_used=last_used))
+    await db.commit()
+
+async def add_turn(session_id: str, user: str, assistant: str, last_used: float, db: AsyncSession) -> Optional[int]:
+    """Append a turn, returns the number of turns not folded into the summary, None if the session is gone"""
+    # one statement, turns added by other workers at the same time are all counted
+    result = await db.execute(
+        update(ChatSession).where(ChatSession.session_id == session_id)
+        .values(turn_count=ChatSession.turn_count + 1, last_used=last_used)
+    )
+    if result.rowcount == 0:
+        await db.rollback()
+        return None
+
+    db.add(ChatTurn(session_id=session_id, user=user, assistant=assistant))
+    await db.commit()
+    return await db.scalar(select(func.count()).select_from(ChatTurn).where(ChatTurn.session_id == session_id))
+
+async def claim_summary(session_id: str, now: float, until: float, db: AsyncSession) -> bool:
+    """Take the session's summary over until `until`, False when another worker is summarizing it"""
+    result = await db.execute(
+        update(ChatSession)
+        .where(ChatSession.session_id == session_id, or_(ChatSession.summarizing_until.is_(None), ChatSession.summarizing_until < now))
+        .values(summarizing_until=until)
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+async def fold(session_id: str, summary: str, last_turn_id: int, db: AsyncSession) -> None:
+    """Replace the turns up to `last_turn_id` with the summary of them and release the claim"""
+    await db.execute(
+        update(ChatSession).where(ChatSession.session_id == session_id).values(summary=summary, summarizing_until=None)
+    )
+    await db.execute(delete_rows(ChatTurn).where(ChatTurn.session_id == session_id, ChatTurn.id <= last_turn_id))
+    await db.commit()
+
+async def release_summary(session_id: str, db: AsyncSession) -> None:
+    await db.execute(update(ChatSession).where(ChatSession.session_id == session_id).values(summarizing_until=None))
+    await db.commit()
+
+async def sizes(db: AsyncSession) -> List[Tuple[str, float, int]]:
+    """(session id, last used, bytes of summary and turn text) of every session, least recently used first"""
+    turn_bytes = (
+        select(ChatTurn.session_id, func.sum(func.length(ChatTurn.user) + func.length(ChatTurn.assistant)).label("bytes"))
+        .group_by(ChatTurn.session_id)
+        .subquery()
+    )
+    rows = await db.execute(
+        select(ChatSession.session_id, ChatSession.last_used, func.length(ChatSession.summary) + func.coalesce(turn_bytes.c.bytes, 0))
+        .outerjoin(turn_bytes, turn_bytes.c.session_id == ChatSession.session_id)
+        .order_by(ChatSession.last_used)
+    )
+    return [(session_id, last_used, size) for session_id, last_used, size in rows.all()]
+
+async def delete(session_ids: List[str], db: AsyncSession) -> int:
+    await db.execute(delete_rows(ChatTurn).where(ChatTurn.session_id.in_(session_ids)))
+    result = await db.execute(delete_rows(ChatSession).where(ChatSession.session_id.in_(session_ids)))
+    await db.commit()
+    return result.rowcount
+
+async def delete_idle(before: float, db: AsyncSession) -> int:
+    """Delete the sessions last used before `before`"""
+    idle = select(ChatSession.session_id).where(ChatSession.last_used < before)
+    await db.execute(delete_rows(ChatTurn).where(ChatTurn.session_id.in_(idle)))
+    result = await db.execute(delete_rows(ChatSession).where(ChatSession.last_used < before))
+    await db.commit()
+    return result.rowcount
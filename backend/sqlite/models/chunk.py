@@ -0,0 +1,50 @@
+from sqlite.database import Base
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Integer, delete, select
+from typing import Dict, List, Tuple
+
+# ids per statement, below SQLite's bound parameter limit
+BATCH_SIZE = 500
+
+class Chunk(Base):
+    """Which chunks of the vector store belong to which Pdf, and a hash of their text"""
+    __tablename__ = 'chunks'
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    pdf_uuid: Mapped[str] = mapped_column(String, index=True)
+    page: Mapped[int] = mapped_column(Integer)
+    content_hash: Mapped[str] = mapped_column(String)
+
+async def get_hashes(pdf_uuid: str, db: AsyncSession) -> Dict[str, str]:
+    """Chunk id -> content hash for every chunk of a document"""
+    rows = await db.execute(select(Chunk.id, Chunk.content_hash).where(Chunk.pdf_uuid == pdf_uuid))
+    return {id_: content_hash for id_, content_hash in rows.all()}
+
+async def get_ids(pdf_uuid: str, db: AsyncSession) -> List[str]:
+    return list((await db.scalars(select(Chunk.id).where(Chunk.pdf_uuid == pdf_uuid))).all())
+
+async def upsert(pdf_uuid: str, chunks: List[Tuple[str, int, str]], db: AsyncSession) -> None:
+    """Record (chunk id, page, content hash) rows for a document, replacing rows with the same id"""
+    for start in range(0, len(chunks), BATCH_SIZE):
+        rows = [
+            {"id": id_, "pdf_uuid": pdf_uuid, "page": page, "content_hash": content_hash}
+            for id_, page, content_hash in chunks[start:start + BATCH_SIZE]
+        ]
+        query = insert(Chunk).values(rows)
+        query = query.on_conflict_do_update(
+            index_elements=[Chunk.id],
+            set_={"pdf_uuid": query.excluded.pdf_uuid, "page": query.excluded.page, "content_hash": query.excluded.content_hash},
+        )
+        await db.execute(query)
+    await db.commit()
+
+async def delete_ids(ids: List[str], db: AsyncSession) -> None:
+    for start in range(0, len(ids), BATCH_SIZE):
+        await db.execute(delete(Chunk).where(Chunk.id.in_(ids[start:start + BATCH_SIZE])))
+    await db.commit()
+
+async def delete_by_pdf(pdf_uuid: str, db: AsyncSession) -> int:
+    result = await db.execute(delete(Chunk).where(Chunk.pdf_uuid == pdf_uuid))
+    await db.commit()
+    return result.rowcount
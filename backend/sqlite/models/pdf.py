@@ -1,33 +1,93 @@
-from fileinput import filename
-from sqlite.database import Base, db
-from sqlalchemy.orm import Session, Mapped, mapped_column
-from sqlalchemy import String, Integer
-from typing import List
+from sqlite.database import Base
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Integer, delete as delete_rows, func, select, update
+from typing import List, Optional, Sequence, Tuple
 from uuid import uuid4
 
 class Pdf(Base):
     __tablename__ = 'pdfs'
     uuid: Mapped[str] = mapped_column(primary_key=True)
-    filename: Mapped[str] = mapped_column(String)
+    filename: Mapped[str] = mapped_column(String, index=True)
     path: Mapped[str] = mapped_column(String)
-    upload_date: Mapped[str] = mapped_column(String)
+    upload_date: Mapped[str] = mapped_column(String, index=True)
     chunks_count: Mapped[int] = mapped_column(Integer)
     status: Mapped[str] = mapped_column(String)
+    file_hash: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True)
 
-def create(filename: str, upload_date: str, chunks_count: int, path: str, status: str, db: Session) -> Pdf:
+async def create(filename: str, upload_date: str, chunks_count: int, path: str, status: str, db: AsyncSession, file_hash: Optional[str] = None) -> Pdf:
     pdf = Pdf(
         uuid=str(uuid4()),
         filename=filename,
         upload_date=upload_date,
         chunks_count=chunks_count,
         path=path,
-        status=status
+        status=status,
+        file_hash=file_hash
     )
 
     db.add(pdf)
-    db.commit()
-    db.refresh(pdf)
+    await db.commit()
     return pdf
 
-def get_all(db: Session) -> List[Pdf]:
-    return db.query(Pdf).all()
+async def get_all(db: AsyncSession) -> List[Pdf]:
+    return list((await db.scalars(select(Pdf))).all())
+
+async def get_page(db: AsyncSession, offset: int = 0, limit: int = 100, filename: Optional[str] = None, status: Optional[str] = None) -> Tuple[List[Pdf], int]:
+    """One page of documents, newest upload first, and the total number matching the filters"""
+    query = select(Pdf)
+    if filename is not None:
+        query = query.where(Pdf.filename == filename)
+    if status is not None:
+        query = query.where(Pdf.status == status)
+
+    total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    pdfs = await db.scalars(query.order_by(Pdf.upload_date.desc(), Pdf.uuid).offset(offset).limit(limit))
+    return list(pdfs.all()), total
+
+async def get_by_uuid(uuid: str, db: AsyncSession) -> Optional[Pdf]:
+    return await db.get(Pdf, uuid)
+
+async def get_by_status(statuses: List[str], db: AsyncSession) -> List[Pdf]:
+    return list((await db.scalars(select(Pdf).where(Pdf.status.in_(statuses)).order_by(Pdf.upload_date))).all())
+
+async def get_by_hash(file_hash: str, db: AsyncSession, exclude_statuses: Optional[Sequence[str]] = None) -> Optional[Pdf]:
+    query = select(Pdf).where(Pdf.file_hash == file_hash)
+    if exclude_statuses:
+        query = query.where(Pdf.status.not_in(exclude_statuses))
+    return await db.scalar(query.limit(1))
+
+async def update_status(uuid: str, status: str, db: AsyncSession, chunks_count: Optional[int] = None) -> Optional[Pdf]:
+    pdf = await get_by_uuid(uuid, db)
+    if pdf is None:
+        return None
+
+    pdf.status = status
+    if chunks_count is not None:
+        pdf.chunks_count = chunks_count
+
+    await db.commit()
+    return pdf
+
+async def update_file(uuid: str, path: str, file_hash: str, db: AsyncSession) -> Optional[Pdf]:
+    pdf = await get_by_uuid(uuid, db)
+    if pdf is None:
+        return None
+
+    pdf.path = path
+    pdf.file_hash = file_hash
+    await db.commit()
+    return pdf
+
+async def count_by_path(path: str, db: AsyncSession) -> int:
+    return await db.scalar(select(func.count()).select_from(Pdf).where(Pdf.path == path))
+
+async def delete(uuid: str, db: AsyncSession) -> bool:
+    result = await db.execute(delete_rows(Pdf).where(Pdf.uuid == uuid))
+    await db.commit()
+    return result.rowcount > 0
+
+async def replace_status(statuses: List[str], status: str, db: AsyncSession) -> int:
+    result = await db.execute(update(Pdf).where(Pdf.status.in_(statuses)).values(status=status))
+    await db.commit()
+    return result.rowcount
@@ -2,4 +2,23 @@ ALLOWED_EXTENSION = {
     'application/pdf',
 }
 
-MAX_SIZE = 10 * 1024 * 1024
\ No newline at end of file
+MAX_SIZE = 10 * 1024 * 1024
+
+# uploads are streamed to disk in pieces of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# a PDF starts with this marker within its first PDF_HEADER_WINDOW bytes
+PDF_MAGIC = b'%PDF-'
+PDF_HEADER_WINDOW = 1024
+# room for the multipart boundary and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Pdf.status values for the ingestion lifecycle
+STATUS_QUEUED = 'queued'
+STATUS_EXTRACTING = 'extracting'
+STATUS_EMBEDDING = 'embedding'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+# a reader worker asked the writer to delete the document
+STATUS_DELETING = 'deleting'
+# a job is running or waiting for these, the document can not be deleted or re-indexed
+STATUSES_IN_PROGRESS = (STATUS_QUEUED, STATUS_EXTRACTING, STATUS_EMBEDDING, STATUS_DELETING)
@@ -0,0 +1,72 @@
+import os
+import numpy as np
+from services import mmap_index
+from services.mmap_index import MmapBackend
+from config import settings
+
+
+def _chunks(start: int, count: int, dimensions: int = 8):
+    rng = np.random.default_rng(start)
+    ids = [f"chunk-{index}" for index in range(start, start + count)]
+    embeddings = rng.standard_normal((count, dimensions)).astype(np.float32).tolist()
+    documents = [f"text {index}" for index in range(start, start + count)]
+    metadatas = [{"source": "a.pdf" if index % 2 else "b.pdf"} for index in range(start, start + count)]
+    return ids, embeddings, documents, metadatas
+
+
+def test_filtered_query_in_reader_after_writer_appended(tmp_path):
+    writer = MmapBackend(str(tmp_path)).get_collection("documents")
+    writer.upsert(*_chunks(0, 20))
+
+    reader_backend = MmapBackend(str(tmp_path))
+    reader = reader_backend.get_collection("documents")
+    # appended after the reader mapped the files, so these slots are beyond its snapshot
+    writer.upsert(*_chunks(20, 20))
+
+    embedding = writer.get_embeddings(["chunk-30"])["chunk-30"]
+    results = reader.query(embedding, 5, where={"source": "a.pdf"})
+    assert len(results) == 5
+    assert all(document.metadata["source"] == "a.pdf" for document, _ in results)
+    assert all(int(document.id.split("-")[1]) < 20 for document, _ in results)
+    assert reader.get_embeddings(["chunk-30"]) == {}
+
+    reader_backend.refresh()
+    results = reader.query(embedding, 1, where={"source": "b.pdf"})
+    assert [document.id for document, _ in results] == ["chunk-30"]
+
+
+def test_reader_follows_compaction_in_writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(mmap_index, "COMPACT_MIN_DEAD", 1)
+    writer = MmapBackend(str(tmp_path)).get_collection("documents")
+    writer.upsert(*_chunks(0, 40))
+    embeddings = writer.get_embeddings([f"chunk-{index}" for index in range(30, 40)])
+
+    reader = MmapBackend(str(tmp_path)).get_collection("documents")
+    assert len(reader.query(embeddings["chunk-35"], 40)) == 40
+    writer.delete([f"chunk-{index}" for index in range(30)])
+    assert writer.rows == 10 and writer.generation == 1
+
+    for id_, embedding in embeddings.items():
+        document, distance = reader.query(embedding, 1)[0]
+        assert document.id == id_ and distance < 1e-4
+    assert reader.generation == 1
+    assert reader.get_embeddings(["chunk-35"]) == {"chunk-35": embeddings["chunk-35"]}
+
+
+def test_only_the_writer_trains_ivf(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "mmap_index", "ivf")
+    monkeypatch.setattr(mmap_index, "IVF_MIN_ROWS", 100)
+    writer = MmapBackend(str(tmp_path)).get_collection("documents")
+    writer.upsert(*_chunks(0, 400))
+    embedding = writer.get_embeddings(["chunk-7"])["chunk-7"]
+
+    reader_backend = MmapBackend(str(tmp_path), read_only=True)
+    reader = reader_backend.get_collection("documents")
+    assert reader.query(embedding, 1)[0][0].id == "chunk-7"
+    assert reader.centroids is None and not os.path.exists(writer.centroids_path)
+
+    assert writer.query(embedding, 1)[0][0].id == "chunk-7"
+    assert writer.centroids is not None
+    reader_backend.refresh()
+    assert reader.lists is not None and np.array_equal(reader.centroids, writer.centroids)
+    assert reader.query(embedding, 1)[0][0].id == "chunk-7"
@@ -0,0 +1,139 @@
+"""Rewrite the chunk metadata of an existing vector store to ChunkMetadata.
+
+Chunks indexed before the compact schema carry the whole page dict as
+metadata, page text included, once per chunk. This keeps filename, page and
+doc id, derives the chunk index from the chunk id (or from the chunk's
+position on the page for uuid ids) and the start/end offsets from the page
+text, then drops everything else. Embeddings and chunk text are untouched,
+so nothing is embedded again. Run from the backend directory, with the app
+stopped:
+
+    python -m tools.compact_metadata --dry-run
+    python -m tools.compact_metadata --vacuum
+
+Every collection of the configured VECTOR_DB_TYPE / VECTOR_DB_PATH is
+migrated, the default one and the per-document partitions alike. Chunks
+that are already compact are skipped, so the tool can be run again.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from models.schemas import ChunkMetadata
+from services.pdf_processor import PDFProcessor, chunk_id
+from services.vector_backends import ChunkRecord, VectorCollection, build_vector_backend
+from config import settings
+
+
+def is_compact(metadata: Dict[str, Any]) -> bool:
+    return "chunk_index" in metadata and "content" not in metadata
+
+
+def compact_page(records: List[ChunkRecord]) -> List[Tuple[str, Dict[str, Any]]]:
+    """(id, compact metadata) for the chunks of one page"""
+    page_text = next((metadata["content"] for _, _, metadata in records if isinstance(metadata.get("content"), str)), "")
+    indexed: List[Tuple[int, ChunkRecord]] = []
+    legacy: List[ChunkRecord] = []
+    for record in records:
+        id_, _, metadata = record
+        index = id_.rpartition(":")[2]
+        if index.isdigit() and id_ == chunk_id(metadata.get("doc_id"), metadata.get("page", 0), int(index)):
+            indexed.append((int(index), record))
+        else:
+            legacy.append(record)
+
+    # uuid ids say nothing about order, number those chunks by where they start on the page
+    legacy.sort(key=lambda record: (page_text.find(record[1] or ""), record[0]))
+    indexed.sort(key=lambda item: item[0])
+    ordered = indexed + [(index, record) for index, record in enumerate(legacy, start=len(indexed))]
+
+    text_chunks = [record[1] or "" for _, record in ordered if record[2].get("content_type") != "table"]
+    offsets = iter(PDFProcessor.chunk_offsets(page_text, text_chunks))
+    results = []
+    for index, (id_, _, metadata) in ordered:
+        compact = ChunkMetadata(
+            doc_id=metadata.get("doc_id"),
+            filename=metadata.get("filename", ""),
+            page=metadata.get("page", 0),
+            chunk_index=index,
+            content_type=metadata.get("content_type"),
+        )
+        if compact.content_type != "table":
+            compact.start, compact.end = next(offsets)
+        results.append((id_, compact.model_dump(exclude_none=True)))
+    return results
+
+
+def migrate(collection: VectorCollection, batch_size: int, dry_run: bool) -> Tuple[int, int, int, int]:
+    """(chunks, chunks rewritten, metadata bytes before, metadata bytes after) for one collection"""
+    pages: Dict[Tuple[str, int], List[ChunkRecord]] = defaultdict(list)
+    chunks, bytes_before, bytes_after = 0, 0, 0
+    offset = 0
+    while records := collection.get(limit=batch_size, offset=offset):
+        offset += len(records)
+        for record in records:
+            chunks += 1
+            size = len(json.dumps(record[2]))
+            bytes_before += size
+            if is_compact(record[2]):
+                bytes_after += size
+            else:
+                pages[(record[2].get("filename", ""), record[2].get("page", 0))].append(record)
+
+    updates = [update for records in pages.values() for update in compact_page(records)]
+    bytes_after += sum(len(json.dumps(metadata)) for _, metadata in updates)
+    if not dry_run:
+        for start in range(0, len(updates), batch_size):
+            batch = updates[start:start + batch_size]
+            collection.update_metadata([id_ for id_, _ in batch], [metadata for _, metadata in batch])
+    return chunks, len(updates), bytes_before, bytes_after
+
+
+def store_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--vacuum", action="store_true", help="reclaim the freed space afterwards")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    backend = build_vector_backend()
+    size_before = store_size(settings.vector_db_path)
+    totals = [0, 0, 0, 0]
+    print(f"{'collection':<40}{'chunks':>9}{'rewritten':>11}{'meta KB before':>16}{'meta KB after':>15}")
+    try:
+        for name in sorted(backend.list_collections()):
+            result = migrate(backend.get_collection(name, create=False), args.batch_size, args.dry_run)
+            totals = [total + value for total, value in zip(totals, result)]
+            chunks, rewritten, before, after = result
+            print(f"{name:<40}{chunks:>9}{rewritten:>11}{before / 1024:>16.1f}{after / 1024:>15.1f}")
+        print(f"{'total':<40}{totals[0]:>9}{totals[1]:>11}{totals[2] / 1024:>16.1f}{totals[3] / 1024:>15.1f}")
+        if args.vacuum and not args.dry_run:
+            if settings.vector_db_type == "chromadb":
+                # Chroma's own CLI does this, with the store closed
+                print(f"run `chroma vacuum --path {settings.vector_db_path}` to reclaim the freed space")
+            else:
+                backend.vacuum()
+    finally:
+        backend.close()
+
+    if not args.dry_run:
+        print(f"store size: {size_before / 1024 / 1024:.1f} MB -> {store_size(settings.vector_db_path) / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()